@@ -0,0 +1,78 @@
+"""
+Synthetic fixtures for benchmarks, generated once per session
+"""
+import os
+import subprocess
+from pathlib import Path
+from shutil import which
+
+import pytest
+
+HASH_FILE_SIZE = 32 * 1024 * 1024
+TREE_DEPTH = 6
+TREE_WIDTH = 3
+TREE_FILES = 4
+
+
+@pytest.fixture(scope="session")
+def data_folder(tmp_path_factory) -> Path:
+    return tmp_path_factory.mktemp("benchmarks")
+
+
+@pytest.fixture(scope="session")
+def random_file(data_folder: Path) -> Path:
+    out = data_folder / "random.bin"
+    with out.open("wb") as fp:
+        for _ in range(HASH_FILE_SIZE // (1024 * 1024)):
+            fp.write(os.urandom(1024 * 1024))
+    return out
+
+
+@pytest.fixture(scope="session")
+def deep_tree(data_folder: Path) -> Path:
+    out = data_folder / "tree"
+
+    def populate(folder: Path, depth: int):
+        folder.mkdir()
+        for index in range(TREE_FILES):
+            (folder / f"file{index}.txt").touch()
+        if depth > 0:
+            for index in range(TREE_WIDTH):
+                populate(folder / f"folder{index}", depth - 1)
+
+    populate(out, TREE_DEPTH)
+    return out
+
+
+@pytest.fixture(scope="session")
+def sample_image(data_folder: Path) -> Path:
+    from PIL import Image  # pylint: disable=import-outside-toplevel
+
+    out = data_folder / "image.jpg"
+    image = Image.effect_mandelbrot((1920, 1080), (-2, -1, 1, 1), 100).convert("RGB")
+    exif = Image.Exif()
+    exif[0x8769] = {0x9003: "2020:01:02 03:04:05"}  # DateTimeOriginal
+    image.save(out, exif=exif)
+    return out
+
+
+@pytest.fixture(scope="session")
+def sample_video(data_folder: Path) -> Path:
+    if which("ffmpeg") is None:
+        pytest.skip("ffmpeg is not installed")
+    out = data_folder / "video.mp4"
+    subprocess.check_call(
+        [
+            "ffmpeg",
+            "-loglevel",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            "testsrc=duration=10:size=1280x720:rate=30",
+            "-pix_fmt",
+            "yuv420p",
+            str(out),
+        ]
+    )
+    return out
@@ -0,0 +1,83 @@
+"""
+Benchmarks of the hot paths, run them with:
+    pytest benchmarks --benchmark-autosave --benchmark-compare
+"""
+import hashlib
+from pathlib import Path
+from shutil import rmtree, which
+
+import pytest
+
+from essembeh_tools.cli.date_renamer import get_create_date
+from essembeh_tools.cli.hrenamer import ALGORITHMS, compute_hash, compute_hashes
+from essembeh_tools.ffmpeg import (
+    Position,
+    extract_frame,
+    extract_frames,
+    get_video_duration,
+)
+from essembeh_tools.filesystem import visit
+from essembeh_tools.images import CropFill, Resize
+
+
+def require(binary: str):
+    if which(binary) is None:
+        pytest.skip(f"{binary} is not installed")
+
+
+def test_compute_hash(benchmark, random_file: Path):
+    benchmark.extra_info["bytes"] = random_file.stat().st_size
+    assert len(benchmark(compute_hash, hashlib.md5, random_file)) == 32
+
+
+@pytest.mark.parametrize("algo", ALGORITHMS.keys())
+def test_hash_throughput(benchmark, random_file: Path, algo: str):
+    benchmark.group = "hash throughput"
+    size = random_file.stat().st_size
+    benchmark(compute_hashes, {algo: ALGORITHMS[algo]}, random_file)
+    # stats are not collected with --benchmark-disable
+    if benchmark.stats is not None:
+        benchmark.extra_info["MB/s"] = round(size / benchmark.stats.stats.mean / 1e6)
+
+
+def test_visit(benchmark, deep_tree: Path):
+    files = benchmark(lambda: list(visit([deep_tree], recursive=True)))
+    assert len(files) > 0
+
+
+def test_get_create_date(benchmark, sample_image: Path):
+    require("exiftool")
+    assert benchmark(get_create_date, sample_image).year == 2020
+
+
+def test_ffprobe(benchmark, sample_video: Path):
+    assert benchmark(get_video_duration, sample_video) == 10
+
+
+def test_extract_frame(benchmark, sample_video: Path, tmp_path: Path):
+    output = tmp_path / "frame.jpg"
+    benchmark(extract_frame, sample_video, output, Position("50%"))
+
+
+def test_extract_frames(benchmark, sample_video: Path, tmp_path: Path):
+    def extract():
+        rmtree(tmp_path / "frames", ignore_errors=True)
+        return extract_frames(sample_video, tmp_path / "frames", fps=5)
+
+    assert len(benchmark.pedantic(extract, rounds=3)) == 50
+
+
+def test_resize(benchmark, sample_image: Path):
+    from PIL import Image  # pylint: disable=import-outside-toplevel
+
+    with Image.open(sample_image) as image:
+        image.load()
+        assert benchmark(Resize((320, 320)).apply, image).size == (320, 180)
+
+
+def test_cropfill(benchmark, sample_image: Path):
+    from PIL import Image  # pylint: disable=import-outside-toplevel
+
+    with Image.open(sample_image) as image:
+        image.load()
+        assert benchmark(CropFill((320, 320)).apply, image).size == (320, 320)
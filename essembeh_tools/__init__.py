@@ -1,6 +1,13 @@
 """
 project metadata
 """
-from importlib.metadata import version
 
-__version__ = version(__name__)
+
+def __getattr__(name: str):
+    # reading the package metadata is slow, only do it when needed
+    if name == "__version__":
+        # pylint: disable=import-outside-toplevel
+        from importlib.metadata import version
+
+        return version(__name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,111 @@
+"""
+Persistent cache of values computed from file content, stored in sqlite
+"""
+import json
+import sqlite3
+from os import environ
+from pathlib import Path
+from time import time
+from typing import Any, Dict, Iterable, Tuple
+
+# entries not used for this many seconds are evicted
+DEFAULT_MAX_AGE = 90 * 24 * 3600
+
+
+def default_cache_folder() -> Path:
+    return (
+        Path(environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "essembeh-tools"
+    )
+
+
+def stat_key(file: Path) -> Tuple[int, int, int, int]:
+    """
+    identify a file content: a file renamed in place keeps its key and a
+    modified file gets a new one
+    """
+    stat = file.stat()
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+class FileCache:
+    """
+    JSON values keyed by device and inode, invalidated when the size or the
+    modification time of the file changes
+    """
+
+    def __init__(self, path: Path, max_age: float = DEFAULT_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self.keys: Dict[Path, Tuple[int, int, int, int]] = {}
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            + "dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER, "
+            + "value TEXT, used REAL, PRIMARY KEY (dev, ino))"
+        )
+
+    def get_many(self, files: Iterable[Path]) -> Dict[Path, Any]:
+        """
+        return the cached values of the files which did not change
+        """
+        out, hits = {}, []
+        for file in files:
+            try:
+                key = self.keys[file] = stat_key(file)
+            except OSError:
+                continue
+            row = self.db.execute(
+                "SELECT value FROM entries "
+                + "WHERE dev=? AND ino=? AND size=? AND mtime_ns=?",
+                key,
+            ).fetchone()
+            if row is not None:
+                out[file] = json.loads(row[0])
+                hits.append(key[0:2])
+        now = time()
+        with self.db:
+            self.db.executemany(
+                "UPDATE entries SET used=? WHERE dev=? AND ino=?",
+                ((now, dev, ino) for dev, ino in hits),
+            )
+        return out
+
+    def put_many(self, values: Dict[Path, Any]):
+        """
+        store values, replacing the entries of modified files
+        """
+        now = time()
+        rows = []
+        for file, value in values.items():
+            key = self.keys.get(file)
+            if key is None:
+                try:
+                    key = stat_key(file)
+                except OSError:
+                    continue
+            rows.append((*key, json.dumps(value), now))
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def evict(self) -> int:
+        """
+        remove entries not used recently, return how many were removed
+        """
+        with self.db:
+            return self.db.execute(
+                "DELETE FROM entries WHERE used < ?", (time() - self.max_age,)
+            ).rowcount
+
+    def close(self):
+        self.evict()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
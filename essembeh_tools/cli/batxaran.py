@@ -1,21 +1,35 @@
-import signal
+import os
+import select
+import stat
 import subprocess
 import sys
-from argparse import ArgumentParser
+from argparse import ArgumentParser, ArgumentTypeError
 from pathlib import Path
-from time import sleep
-from typing import Iterable
+from queue import Queue
+from re import fullmatch
+from threading import Semaphore as ThreadSemaphore
+from threading import Thread
+from time import monotonic, sleep
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Container,
+    Iterable,
+    Iterator,
+    Optional,
+    Set,
+    TextIO,
+    Tuple,
+)
+
+if TYPE_CHECKING:
+    import asyncio
 
 from ..colors import Color, Icons, Label
 
 DEFAULT_COMMAND = r'xdg-open "{}"'
-
-
-def on_signal(*args, **kwargs):
-    raise TimeoutError()
-
-
-signal.signal(signal.SIGALRM, on_signal)
+FOLLOW_POLL_INTERVAL = 0.5
+FOLLOW_QUEUE_SIZE = 1024
 
 
 def filter_comments(iterable: Iterable[str]) -> Iterable[str]:
@@ -30,20 +44,191 @@ def filter_comments(iterable: Iterable[str]) -> Iterable[str]:
     )
 
 
-def transition(prefix: str, command: str, interactive: bool, timeout: int):
+def follow(fp: TextIO, chunk_size: int = 65536) -> Iterator[str]:
+    """
+    Read lines as they are written, by chunks: on a fifo, stop when all writers
+    are closed, on a regular file, wait for new content like tail -f
+    """
+    fd = fp.fileno()
+    is_fifo = stat.S_ISFIFO(os.fstat(fd).st_mode)
+    buffer = b""
+    while True:
+        chunk = os.read(fd, chunk_size)
+        if len(chunk) == 0:
+            if is_fifo:
+                break
+            sleep(FOLLOW_POLL_INTERVAL)
+            continue
+        lines = (buffer + chunk).split(b"\n")
+        buffer = lines.pop()
+        yield from (line.decode() for line in lines)
+    if len(buffer) > 0:
+        yield buffer.decode()
+
+
+def buffered(iterable: Iterable[str], size: int = FOLLOW_QUEUE_SIZE) -> Iterator[str]:
+    """
+    Consume the iterable in a thread and feed a bounded queue, so that the
+    producer is never stalled by the consumer unless the queue is full
+    """
+    queue: Queue = Queue(maxsize=size)
+    end = object()
+
+    def producer():
+        try:
+            for item in iterable:
+                queue.put(item)
+        except BaseException as error:  # pylint: disable=broad-except
+            queue.put(error)
+        queue.put(end)
+
+    Thread(target=producer, daemon=True).start()
+    while (item := queue.get()) is not end:
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
+def parse_rate(text: str) -> float:
+    """
+    parse a rate like 10, 10/s, 30/m or 100/h as a number of commands per second
+    """
+    matcher = fullmatch(r"(?P<count>[0-9]+(\.[0-9]+)?)(/(?P<unit>[smh]))?", text)
+    if matcher is None or float(matcher.group("count")) <= 0:
+        raise ArgumentTypeError(f"invalid rate {text}, expected N/s, N/m or N/h")
+    return (
+        float(matcher.group("count"))
+        / {None: 1, "s": 1, "m": 60, "h": 3600}[matcher.group("unit")]
+    )
+
+
+def parse_burst(text: str) -> int:
+    """
+    parse a burst size, at least one command
+    """
+    if not text.isdigit() or int(text) < 1:
+        raise ArgumentTypeError(f"invalid burst {text}, expected at least 1")
+    return int(text)
+
+
+class TokenBucket:
+    """
+    Rate limiter allowing bursts, the rate is halved after each failure and
+    restored step by step after each success
+    """
+
+    def __init__(self, rate: Optional[float] = None, burst: int = 1):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = monotonic()
+
+    def reserve(self) -> float:
+        """
+        take a token and return the delay to wait before using it
+        """
+        if self.rate is None:
+            return 0
+        now = monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        self.tokens -= 1
+        return max(0, -self.tokens / self.rate)
+
+    def feedback(self, success: bool):
+        if self.rate is None:
+            return
+        if success:
+            self.rate = min(self.max_rate, self.rate * 1.25)
+        else:
+            self.rate = max(self.max_rate / 64, self.rate / 2)
+
+
+class DoneFile:
+    """
+    Items already processed, kept in a set and appended to the file (and synced)
+    after each success so that a crash does not lose any progress
+    """
+
+    def __init__(self, path: Optional[Path]):
+        self.path = path
+        self.items: Set[str] = set()
+        self.added = 0
+        self.fp = None
+
+    def load(self) -> int:
+        """
+        load the items from file and compact it if it contains duplicates,
+        keeping the comments and empty lines
+        """
+        if self.path is not None and self.path.is_file():
+            lines, duplicates = [], 0
+            for line in self.path.read_text().splitlines():
+                item = line.strip()
+                if len(item) == 0 or item.startswith("#"):
+                    lines.append(line)
+                elif item in self.items:
+                    duplicates += 1
+                else:
+                    self.items.add(item)
+                    lines.append(line)
+            if duplicates > 0:
+                tmpfile = self.path.with_name(self.path.name + ".tmp")
+                tmpfile.write_text("".join(f"{x}\n" for x in lines))
+                os.replace(tmpfile, self.path)
+        return len(self.items)
+
+    def __contains__(self, item: object) -> bool:
+        return item in self.items
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def add(self, item: str):
+        if item in self.items:
+            return
+        self.items.add(item)
+        self.added += 1
+        if self.path is not None:
+            if self.fp is None:
+                # ensure the last item is terminated before appending
+                unterminated = False
+                if self.path.is_file() and self.path.stat().st_size > 0:
+                    with self.path.open("rb") as fp:
+                        fp.seek(-1, os.SEEK_END)
+                        unterminated = fp.read(1) != b"\n"
+                self.fp = self.path.open("a")
+                if unterminated:
+                    self.fp.write("\n")
+            self.fp.write(f"{item}\n")
+            self.fp.flush()
+            os.fsync(self.fp.fileno())
+
+    def close(self):
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+
+
+def transition(prefix: str, command: str, interactive: bool, timeout: float):
     """
     Handle a transition between 2 commands, with interactive prompt and/or sleep delay
     """
     if timeout > 0:
-        signal.alarm(timeout)
-        try:
-            input(
-                f"{prefix} Press ENTER or wait {timeout} seconds to execute: {Color.YELLOW(command)} "
+        if sys.stdin.isatty():
+            print(
+                f"{prefix} Press ENTER or wait {timeout:.1f} seconds to execute: {Color.YELLOW(command)} ",
+                end="",
+                flush=True,
             )
-        except TimeoutError:
-            print("")
-        finally:
-            signal.alarm(0)
+            if select.select([sys.stdin], [], [], timeout)[0]:
+                sys.stdin.readline()
+            else:
+                print("")
+        else:
+            sleep(timeout)
+            print(f"{prefix} Execute:  {Color.YELLOW(command)}")
     else:
         if interactive:
             input(f"{prefix} Press ENTER to execute: {Color.YELLOW(command)} ")
@@ -66,6 +251,127 @@ def execute(command: str, retry: int, retry_delay: int = 1, verbose: bool = Fals
     return False
 
 
+async def execute_async(
+    command: str, prefix: str, retry: int, retry_delay: float = 1
+) -> bool:
+    """
+    Execute a shell command in a subprocess with its output prefixed,
+    retry in case of error with an exponential backoff
+    """
+    import asyncio  # pylint: disable=import-outside-toplevel
+
+    for attempt in range(retry + 1):
+        process = await asyncio.create_subprocess_shell(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        async for line in process.stdout:
+            print(prefix, line.decode(errors="replace").rstrip())
+        if await process.wait() == 0:
+            print(prefix, Color.GREEN("OK"), Color.YELLOW(command))
+            return True
+        print(prefix, Color.RED("ERROR"), Color.YELLOW(command))
+        if attempt < retry:
+            await asyncio.sleep(retry_delay * 2**attempt)
+    return False
+
+
+async def execute_parallel(
+    items: Iterator[Tuple[int, str, str, str]],
+    running: Set[str],
+    jobs: int,
+    retry: int,
+    on_success: Callable[[str], None],
+    bucket: TokenBucket,
+):
+    """
+    Execute the commands with at most N concurrent subprocesses, started at the
+    pace allowed by the token bucket
+    """
+    import asyncio  # pylint: disable=import-outside-toplevel
+
+    semaphore = asyncio.Semaphore(jobs)
+    tasks: Set["asyncio.Task"] = set()
+    loop = asyncio.get_running_loop()
+    queue: "asyncio.Queue" = asyncio.Queue()
+    # items are read on demand, so that running items are checked when read
+    wanted = ThreadSemaphore(0)
+    end = object()
+
+    def reader():
+        # items may block when reading a fifo, so iterate them in a daemon
+        # thread which never delays the exit, unlike the default executor
+        try:
+            while True:
+                wanted.acquire()
+                item = next(items, end)
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+                if item is end:
+                    return
+        except BaseException as error:  # pylint: disable=broad-except
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, error)
+            except RuntimeError:
+                # the event loop is already closed
+                pass
+
+    Thread(target=reader, daemon=True).start()
+
+    async def worker(prefix: str, line: str, command: str):
+        try:
+            success = await execute_async(command, prefix, retry)
+            bucket.feedback(success)
+            if success:
+                on_success(line)
+        finally:
+            running.discard(line)
+            semaphore.release()
+
+    while True:
+        await semaphore.acquire()
+        wanted.release()
+        item = await queue.get()
+        if item is end:
+            semaphore.release()
+            break
+        if isinstance(item, BaseException):
+            raise item
+        _, prefix, line, command = item
+        running.add(line)
+        await asyncio.sleep(bucket.reserve())
+        task = asyncio.create_task(worker(prefix, line, command))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    await asyncio.gather(*tasks)
+
+
+def iterate(
+    content: Iterable[str],
+    command: str,
+    skip: int,
+    done_list: Container[str],
+    running: Container[str] = (),
+) -> Iterator[Tuple[int, str, str, str]]:
+    """
+    Yield the index, prefix, line and command of items to execute,
+    skipped, running and already done items are only printed
+    """
+    for count, line in enumerate(content, start=1):
+        prefix = (
+            f"[{count}/{len(content)}]" if isinstance(content, list) else f"[{count}]"
+        )
+        command_shell = command.replace(r"{}", line)
+        if skip > 0:
+            print(prefix, Color.CYAN("SKIP"), command_shell)
+            skip -= 1
+        elif line in done_list or line in running:
+            print(prefix, Color.CYAN("IGNORE"), command_shell)
+        else:
+            yield count, prefix, line, command_shell
+
+
 def run():
     """
     Entrypoint
@@ -83,7 +389,7 @@ def run():
         "--follow",
         dest="follow",
         action="store_true",
-        help="read file line per line (useful when using a fifo as input file)",
+        help="read file as it is written, until writers are closed for a fifo or forever for a regular file",
     )
     parser.add_argument(
         "-x",
@@ -100,13 +406,26 @@ def run():
         metavar="FILE",
         help="file containing items already processed",
     )
+    parser.add_argument(
+        "--rate",
+        type=parse_rate,
+        metavar="N/s",
+        help="maximum rate of commands, per second (N/s), minute (N/m) or hour (N/h), slowed down after errors",
+    )
+    parser.add_argument(
+        "--burst",
+        type=parse_burst,
+        metavar="N",
+        default=1,
+        help="allow bursts of N commands with --rate (default is 1)",
+    )
     parser.add_argument(
         "--sleep",
         dest="delay",
         metavar="SECONDS",
-        type=int,
+        type=float,
         default=0,
-        help="delay between commands",
+        help="delay between commands, same as --rate 1/SECONDS",
     )
     parser.add_argument(
         "--skip",
@@ -124,54 +443,66 @@ def run():
         default=3,
         help="retry N times in case of error (default is 0)",
     )
+    parser.add_argument(
+        "-j",
+        "--parallel",
+        dest="jobs",
+        metavar="N",
+        type=int,
+        default=1,
+        help="run N commands concurrently, requires --yes (default is 1)",
+    )
     parser.add_argument(
         "items", type=Path, metavar="FILE", help="file containing elements to open"
     )
     args = parser.parse_args()
 
-    done_list = []
-
-    if args.done_file is not None and args.done_file.is_file():
-        done_list += set(filter_comments(args.done_file.read_text().splitlines()))
+    done_list = DoneFile(args.done_file)
+    if done_list.load() > 0:
         print(f"Load {len(done_list)} items from {Label.file(args.done_file)}")
 
     try:
-        count = 1
         assert args.items.exists(), f"Cannot find file {args.items}"
+        assert (
+            args.jobs == 1 or not args.interactive
+        ), "--parallel cannot be used in interactive mode, use --yes"
         with args.items.open() as fp:
             content = (
-                filter_comments(fp)
+                filter_comments(buffered(follow(fp)))
                 if args.follow
                 else list(filter_comments(fp.readlines()))
             )
-            for line in content:
-                prefix = (
-                    f"[{count}/{len(content)}]"
-                    if isinstance(content, list)
-                    else f"[{count}]"
-                )
-                command_shell = args.command.replace(r"{}", line)
-                if args.skip > 0:
-                    print(prefix, Color.CYAN("SKIP"), command_shell)
-                    args.skip -= 1
-                elif line in done_list:
-                    print(prefix, Color.CYAN("IGNORE"), command_shell)
-                else:
-                    transition(
-                        prefix,
-                        command_shell,
-                        args.interactive,
-                        args.delay if count > 1 else 0,
+            running = set()
+            items = iterate(content, args.command, args.skip, done_list, running)
+            bucket = TokenBucket(
+                args.rate or (1 / args.delay if args.delay > 0 else None),
+                burst=args.burst,
+            )
+            if args.jobs > 1:
+                import asyncio  # pylint: disable=import-outside-toplevel
+
+                asyncio.run(
+                    execute_parallel(
+                        items, running, args.jobs, args.retry, done_list.add, bucket
                     )
-                    if execute(command_shell, args.retry, verbose=True):
-                        done_list.append(line)
-                count += 1
+                )
+            else:
+                for index, prefix, line, command_shell in items:
+                    delay = bucket.reserve()
+                    if args.interactive and bucket.rate is not None and index > 1:
+                        # keep the timed prompt even when the pace is respected
+                        delay = max(delay, 1 / bucket.rate)
+                    transition(prefix, command_shell, args.interactive, delay)
+                    success = execute(command_shell, args.retry, verbose=True)
+                    bucket.feedback(success)
+                    if success:
+                        done_list.add(line)
     except KeyboardInterrupt:
         pass
     except BaseException as error:  # pylint: disable=broad-except
         print(Icons.BOOM, Label.error(error))
         sys.exit(2)
     finally:
-        if len(done_list) > 0 and args.done_file is not None:
-            args.done_file.write_text("\n".join(done_list))
-            print(f"Save {len(done_list)} items in {Label.file(args.done_file)}")
+        done_list.close()
+        if done_list.added > 0 and args.done_file is not None:
+            print(f"Save {done_list.added} items in {Label.file(args.done_file)}")
@@ -1,18 +1,24 @@
 import json
-import shutil
 from argparse import ONE_OR_MORE, ArgumentParser
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
+from typing import Dict, List, Optional, Set, Union
 
 from colorama import Fore, Style
 
+from .. import service
+from ..cache import FileCache, default_cache_folder
 from ..colors import Icons, Label
-from ..external import ExternalTool
+from ..external import CoProcess, CoProcessPool, ExternalTool
 from ..filesystem import visit
-from ..utils import plural
+from ..journal import Journal, Operation, apply
+from ..metrics import add_metrics_arguments, setup_metrics
+from ..utils import parser_group, plural
 
 EXIFTOOL = ExternalTool("exiftool", common_args=["-G", "-j"])
+# files given to exiftool per request, small enough to keep all threads busy
+BATCH_SIZE = 32
 
 
 EXIF_KEYS_BY_PREFIX = {
@@ -39,37 +45,131 @@ def parse_date(text: str) -> datetime:
     return datetime.fromisoformat(text.replace(":", "-", 2)[0:19])
 
 
-def get_create_date(file: Path):
+def exiftool_coprocess() -> CoProcess:
     """
-    get date prefix
+    exiftool kept running to avoid its startup time for each file
+    """
+    return CoProcess(
+        [
+            EXIFTOOL.binary,
+            "-stay_open",
+            "True",
+            "-@",
+            "-",
+            "-common_args",
+            *EXIFTOOL.common_args,
+        ],
+        execute=["-execute"],
+        ready="{ready}",
+        close=["-stay_open", "False"],
+    )
+
+
+EXIFTOOL_POOL = CoProcessPool(exiftool_coprocess)
+
+
+def exiftool_request(*args: str) -> str:
+    """
+    run an exiftool request, on the warm exiftool processes of the server
+    when the tool is run by one
+    """
+    if service.available():
+        return service.call("exiftool", *args)
+    return EXIFTOOL_POOL.get().request(*args)
+
+
+def exif_entry(exif: dict) -> dict:
+    """
+    keep the metadata needed to rename a file: its mime type, the tag
+    containing its date and the date itself
+    """
+    filetype = exif.get("File:MIMEType")
+    if filetype is None:
+        raise ValueError(f"Cannot find mime type of {exif.get('SourceFile')}")
+    for prefix, keys in EXIF_KEYS_BY_PREFIX.items():
+        if filetype.startswith(prefix):
+            for key in keys:
+                if key in exif:
+                    return {"mime": filetype, "tag": key, "date": exif[key]}
+    return {"mime": filetype, "tag": None, "date": None}
+
+
+def entry_date(file: Path, entry: dict) -> datetime:
+    """
+    get the date of a file from its metadata
+    """
+    if entry["tag"] is None:
+        if any(entry["mime"].startswith(prefix) for prefix in EXIF_KEYS_BY_PREFIX):
+            raise ValueError(f"Cannot find date for {file}")
+        raise ValueError(f"Unsupported file type {entry['mime']} for {file}")
+    return parse_date(entry["date"])
+
+
+def read_entries(files: List[Path]) -> Dict[Path, Union[dict, Exception]]:
+    """
+    read the metadata of many files with a single exiftool request, each file
+    is associated to its metadata or to the error
     """
-    if not file.exists():
-        raise IOError(f"Cannot find {file}")
+    out: Dict[Path, Union[dict, Exception]] = {}
+    for file in files:
+        if not file.exists():
+            out[file] = IOError(f"Cannot find {file}")
+    files = [f for f in files if f not in out]
+    if len(files) > 0:
+        # absolute paths, the server does not run in the current folder
+        paths = {f: str(f.absolute()) for f in files}
+        response = exiftool_request(*paths.values())
+        payload = json.loads(response) if response.strip() else []
+        assert isinstance(payload, list)
+        exifs = {entry.get("SourceFile"): entry for entry in payload}
+        for file in files:
+            try:
+                exif = exifs.get(paths[file])
+                if exif is None:
+                    raise ValueError(f"Cannot read metadata of {file}")
+                out[file] = exif_entry(exif)
+            except Exception as error:  # pylint: disable=broad-except
+                # a bad file must not fail the whole batch
+                out[file] = error
+    return out
 
-    with EXIFTOOL.with_command(file) as cmd:
-        payload = json.loads(cmd.check_output())
 
-        assert isinstance(payload, list) and len(payload) == 1
-        exif = payload[0]
+def get_create_dates(files: List[Path]) -> Dict[Path, Union[datetime, Exception]]:
+    """
+    get the date of many files, each file is associated to its date or to the
+    error
+    """
+    out: Dict[Path, Union[datetime, Exception]] = {}
+    for file, entry in read_entries(files).items():
+        try:
+            if isinstance(entry, Exception):
+                raise entry
+            out[file] = entry_date(file, entry)
+        except Exception as error:  # pylint: disable=broad-except
+            out[file] = error
+    return out
 
-        filetype = exif["File:MIMEType"]
-        for prefix, keys in EXIF_KEYS_BY_PREFIX.items():
-            if filetype.startswith(prefix):
-                for key in keys:
-                    if key in exif:
-                        return parse_date(exif[key])
-                raise ValueError(f"Cannot find date for {file}")
 
-    raise ValueError(f"Unsupported file type {filetype} for {file}")
+def get_create_date(file: Path) -> datetime:
+    """
+    get date prefix
+    """
+    out = get_create_dates([file])[file]
+    if isinstance(out, Exception):
+        raise out
+    return out
 
 
-def get_next_name(folder: Path, prefix: str, suffix: str) -> Path:
+def get_next_name(
+    folder: Path, prefix: str, suffix: str, reserved: Optional[Set[Path]] = None
+) -> Path:
     """
     find filename which wouldn't overwrite anything in the given folder
+    nor any filename already reserved
     """
     for index in range(1, 999):
         dest = folder / f"{prefix}{index:03}{suffix}"
-        if not dest.exists():
+        if (reserved is None or dest not in reserved) and not dest.exists():
             return dest
     raise ValueError(f"Cannot find a suitable filename in {folder}")
 
@@ -97,23 +197,68 @@ def run():
         type=Path,
         help="move renamed files in this folder",
     )
+    parser.add_argument(
+        "--journal",
+        type=Path,
+        metavar="FILE",
+        help="write planned operations and their status to FILE, see journal command to resume or rollback",
+    )
+    with parser_group(parser, exclusive=True) as group:
+        group.add_argument(
+            "--cache",
+            type=Path,
+            metavar="FILE",
+            default=default_cache_folder() / "date-renamer.sqlite",
+            help=f"cache of the metadata read from files (default is {default_cache_folder() / 'date-renamer.sqlite'})",
+        )
+        group.add_argument(
+            "--no-cache",
+            dest="cache",
+            action="store_const",
+            const=None,
+            help="do not use the cache, read metadata from all files",
+        )
     parser.add_argument(
         "files",
         nargs=ONE_OR_MORE,
         type=Path,
         help="files to rename",
     )
+    add_metrics_arguments(parser)
     args = parser.parse_args()
+    setup_metrics(args)
     count_already_named, count_error, count_renamed = 0, 0, 0
+    plan, targets = [], set()
+    files = list(visit(args.files, recursive=args.recursive))
+    cache = FileCache(args.cache) if args.cache is not None else None
+    cached = cache.get_many(files) if cache is not None else {}
+    misses = [f for f in files if f not in cached]
+    new_entries = {}
     with ThreadPoolExecutor() as executor:
         jobs = {
-            executor.submit(get_create_date, f): f
-            for f in visit(args.files, recursive=args.recursive)
+            executor.submit(read_entries, batch): batch
+            for batch in (
+                misses[i : i + BATCH_SIZE] for i in range(0, len(misses), BATCH_SIZE)
+            )
         }
-        for job in as_completed(jobs):
-            source = jobs[job]
+
+        def results():
+            yield from cached.items()
+            for job in as_completed(jobs):
+                for source, entry in (
+                    job.result()
+                    if job.exception() is None
+                    else dict.fromkeys(jobs[job], job.exception())
+                ).items():
+                    if isinstance(entry, dict):
+                        new_entries[source] = entry
+                    yield source, entry
+
+        for source, entry in results():
             try:
-                create_date = job.result()
+                if isinstance(entry, BaseException):
+                    raise entry
+                create_date = entry_date(source, entry)
                 prefix = create_date.strftime("%Y-%m-%d_%Hh%Mm%Ss_")
                 if source.name.startswith(prefix) and (
                     args.output is None or source.parent == args.output
@@ -122,21 +267,13 @@ def run():
                     print(Icons.RED_FLAG, f"{Label.file(source)} is already renamed")
                 else:
                     target = get_next_name(
-                        args.output or source.parent, prefix, source.suffix.lower()
+                        args.output or source.parent,
+                        prefix,
+                        source.suffix.lower(),
+                        reserved=targets,
                     )
-                    if args.dryrun:
-                        count_renamed += 1
-                        print(
-                            Icons.DRYRUN,
-                            f"{Label.file(source)} would be renamed {Label.file(target)} {Fore.CYAN}(dryrun){Style.RESET_ALL}",
-                        )
-                    else:
-                        shutil.move(source, target)
-                        count_renamed += 1
-                        print(
-                            Icons.OK,
-                            f"{Label.file(source)} was renamed {Label.file(target)}",
-                        )
+                    targets.add(target)
+                    plan.append(Operation("move", source, target))
             except KeyboardInterrupt:
                 executor.shutdown(wait=False, cancel_futures=True)
                 exit(1)
@@ -146,6 +283,43 @@ def run():
                     Icons.BOOM,
                     f"cannot be renamed {Label.file(source)}: {Label.error(error)}",
                 )
+    EXIFTOOL_POOL.close()
+    if cache is not None:
+        cache.put_many(new_entries)
+        cache.close()
+
+    journal = None
+    if args.journal is not None:
+        journal = Journal(args.journal)
+        journal.save(plan)
+        print(
+            f"Save {len(plan)} {plural('operation', len(plan))} in {Label.file(args.journal)}"
+        )
+
+    if args.dryrun:
+        for operation in plan:
+            count_renamed += 1
+            print(
+                Icons.DRYRUN,
+                f"{Label.file(operation.source)} would be renamed {Label.file(operation.dest)} {Fore.CYAN}(dryrun){Style.RESET_ALL}",
+            )
+    else:
+        try:
+            for operation, error in apply(plan, journal=journal):
+                if error is None:
+                    count_renamed += 1
+                    print(
+                        Icons.OK,
+                        f"{Label.file(operation.source)} was renamed {Label.file(operation.dest)}",
+                    )
+                else:
+                    count_error += 1
+                    print(
+                        Icons.BOOM,
+                        f"cannot be renamed {Label.file(operation.source)}: {Label.error(error)}",
+                    )
+        except KeyboardInterrupt:
+            exit(1)
 
     if count_renamed:
         print(
@@ -1,24 +1,42 @@
-import shutil
+import stat
 from argparse import ONE_OR_MORE, ArgumentParser
 from pathlib import Path
+from typing import Dict, Iterable, Optional
 
 from ..colors import Icons, Label
+from ..journal import Journal, Operation, apply
+from ..metrics import add_metrics_arguments, setup_metrics
 from ..utils import parser_group, plural
 
 
-def move(source, dest):
-    assert source.exists() and not dest.exists()
-    shutil.move(source, dest)
+class PrefixIndex:
+    """
+    Trie of folder names to find the longest folder name which is a prefix of a filename
+    """
 
+    def __init__(self, folders: Iterable[Path] = ()):
+        self.root: Dict[str, Dict] = {}
+        for folder in folders:
+            self.add(folder)
 
-def copy(source, dest):
-    assert source.exists() and not dest.exists()
-    shutil.copy(source, dest)
+    def add(self, folder: Path):
+        node = self.root
+        for char in folder.name:
+            node = node.setdefault(char, {})
+        node[""] = folder
 
-
-def link(source, dest):
-    assert source.exists() and not dest.exists()
-    dest.symlink_to(source.resolve())
+    def longest_prefix(self, name: str) -> Optional[Path]:
+        """
+        walk the trie along the given name and keep the deepest folder found
+        """
+        out = self.root.get("")
+        node = self.root
+        for char in name:
+            node = node.get(char)
+            if node is None:
+                break
+            out = node.get("", out)
+        return out
 
 
 def run():
@@ -29,6 +47,20 @@ def run():
         action="store_true",
         help="dry-run mode, do not change anything",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        metavar="THREADS",
+        default=1,
+        help="parallel jobs (default is 1)",
+    )
+    parser.add_argument(
+        "--journal",
+        type=Path,
+        metavar="FILE",
+        help="write planned operations and their status to FILE, see journal command to resume or rollback",
+    )
     parser.add_argument(
         "-o",
         "--output",
@@ -43,8 +75,8 @@ def run():
             "--move",
             dest="operation",
             action="store_const",
-            const=move,
-            default=move,
+            const="move",
+            default="move",
             help="move files",
         )
         group.add_argument(
@@ -52,8 +84,8 @@ def run():
             "--link",
             dest="operation",
             action="store_const",
-            const=link,
-            default=move,
+            const="link",
+            default="move",
             help="do symbolic links instead of moving files",
         )
         group.add_argument(
@@ -61,7 +93,7 @@ def run():
             "--copy",
             dest="operation",
             action="store_const",
-            const=copy,
+            const="copy",
             help="copy files instead of moving them",
         )
     parser.add_argument(
@@ -71,52 +103,82 @@ def run():
         type=Path,
         help="files to move/copy/link",
     )
+    add_metrics_arguments(parser)
 
     args = parser.parse_args()
+    setup_metrics(args)
 
-    dest_folders = [d for d in args.output.iterdir() if d.is_dir()]
+    dest_folders = PrefixIndex(d for d in args.output.iterdir() if d.is_dir())
+    output_device = args.output.stat().st_dev
     count_ok, count_nodest, count_error = 0, 0, 0
-    for source in filter(Path.is_file, args.files):
-        candidate = max(
-            [d for d in dest_folders if source.name.startswith(d.name)],
-            key=lambda x: len(x.name),
-            default=None,
-        )
+
+    # first pass to plan all operations and detect cross-device moves up front
+    operations = {}
+    for source in args.files:
+        try:
+            source_stat = source.stat()
+        except OSError:
+            continue
+        if not stat.S_ISREG(source_stat.st_mode):
+            continue
+        candidate = dest_folders.longest_prefix(source.name)
         if candidate is None:
             count_nodest += 1
             print(
                 Icons.QUESTION,
                 f"no subfolder for {Label.file(source)} in {Label.folder(args.output)}",
             )
+            continue
+        dest = candidate / source.name
+        if dest in operations or dest.exists():
+            count_error += 1
+            print(Icons.ERROR, f"destination file {Label.file(dest)} already exists")
         else:
-            dest = candidate / source.name
-            if dest.exists():
-                count_error += 1
-                print(
-                    Icons.ERROR, f"destination file {Label.file(dest)} already exists"
-                )
-            elif args.dryrun:
-                count_ok += 1
-                print(
-                    Icons.DRYRUN,
-                    f"{args.operation.__name__} {Label.file(source)} to {Label.folder(candidate)} (dryrun)",
-                )
-            else:
-                try:
-                    args.operation(source, dest)
+            operations[dest] = (source, source_stat.st_dev == output_device)
+
+    count_crossdev = sum(1 for _, same_device in operations.values() if not same_device)
+    if args.operation == "move" and count_crossdev > 0:
+        print(
+            Icons.HINT,
+            f"{count_crossdev} {plural('file', count_crossdev)} on another filesystem than {Label.folder(args.output)} will be copied then removed",
+        )
+
+    plan = [
+        Operation(args.operation, source, dest, same_device)
+        for dest, (source, same_device) in operations.items()
+    ]
+    journal = None
+    if args.journal is not None:
+        journal = Journal(args.journal)
+        journal.save(plan)
+        print(
+            f"Save {len(plan)} {plural('operation', len(plan))} in {Label.file(args.journal)}"
+        )
+
+    if args.dryrun:
+        for operation in plan:
+            count_ok += 1
+            print(
+                Icons.DRYRUN,
+                f"{operation.action} {Label.file(operation.source)} to {Label.folder(operation.dest.parent)} (dryrun)",
+            )
+    else:
+        try:
+            for operation, error in apply(plan, journal=journal, jobs=args.jobs):
+                if error is None:
                     count_ok += 1
                     print(
                         Icons.OK,
-                        f"{args.operation.__name__} {Label.file(source)} to {Label.folder(candidate)}",
+                        f"{operation.action} {Label.file(operation.source)} to {Label.folder(operation.dest.parent)}",
                     )
-                except KeyboardInterrupt:
-                    break
-                except BaseException as error:  # pylint: disable=broad-except
+                else:
                     count_error += 1
                     print(
                         Icons.BOOM,
-                        f"cannot {args.operation.__name__} {Label.file(source)} to {Label.folder(candidate)}: {Label.error(error)}",
+                        f"cannot {operation.action} {Label.file(operation.source)} to {Label.folder(operation.dest.parent)}: {Label.error(error)}",
                     )
+        except KeyboardInterrupt:
+            pass
 
     print()
     if count_ok:
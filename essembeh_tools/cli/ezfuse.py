@@ -9,9 +9,10 @@ import sys
 from argparse import ArgumentParser
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from ..colors import Color, Icons, Label
+from ..mounts import MountRegistry, wait_mount
 
 COMMMANDS = (
     ("q", "umount and exit"),
@@ -37,7 +38,73 @@ def execute(
     env = dict(os.environ)
     if isinstance(extra_env, dict):
         env.update(extra_env)
-    subprocess.run(command, cwd=str(cwd) if cwd else None, check=check_rc, env=env)
+    return subprocess.run(
+        command, cwd=str(cwd) if cwd else None, check=check_rc, env=env
+    )
+
+
+def mount_command(binary: str, extra_args: List[str]) -> List[str]:
+    """
+    the mount command, with paths made absolute to find the same mount from
+    another folder
+    """
+    return [binary] + [
+        str(Path(x).resolve()) if not x.startswith("-") and Path(x).exists() else x
+        for x in extra_args
+    ]
+
+
+def mount(
+    registry: MountRegistry,
+    command: List[str],
+    parent_folder: Path,
+    timeout: float = 10,
+) -> Path:
+    """
+    reuse a mountpoint of the same filesystem or mount it in a new one and
+    wait for it to be ready
+    """
+    with registry:
+        mountpoint = registry.acquire(command)
+        if mountpoint is not None:
+            print(Icons.HINT, "Reusing mountpoint", Label.folder(mountpoint))
+            return mountpoint
+        with TemporaryDirectory(
+            prefix=f"ezmount-{Path(command[0]).name}-", dir=str(parent_folder)
+        ) as tempdir:
+            mountpoint = Path(tempdir).resolve()
+        mountpoint.mkdir()
+        print(Icons.HINT, "Using mountpoint", Label.folder(mountpoint))
+        try:
+            execute(*command, mountpoint)
+            wait_mount(mountpoint, timeout=timeout)
+        except BaseException:
+            # In case of error, try to remove the mountpoint
+            print(Icons.HINT, "Remove mountpoint", Label.folder(mountpoint))
+            mountpoint.rmdir()
+            raise
+        registry.add(command, mountpoint)
+        return mountpoint
+
+
+def umount(registry: MountRegistry, command: List[str], mountpoint: Path) -> bool:
+    """
+    stop holding the mountpoint and umount it if no other running ezfuse uses
+    it, return True if it was umounted
+    """
+    with registry:
+        holders = registry.release(command)
+        if holders > 0:
+            print(
+                Icons.HINT,
+                f"Mountpoint still used by {holders} other ezfuse, not umounted",
+            )
+            return False
+        execute("fusermount", "-u", "-z", mountpoint)
+        registry.remove(command)
+        print(Icons.HINT, "Remove mountpoint", Label.folder(mountpoint))
+        mountpoint.rmdir()
+        return True
 
 
 def run():
@@ -59,6 +126,19 @@ def run():
         action="store_true",
         help="create temporary folder in current directory, default is home folder",
     )
+    parser.add_argument(
+        "-e",
+        "--exec",
+        metavar="CMD",
+        help="run CMD in the mountpoint then umount, without any prompt",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        metavar="SECONDS",
+        default=10,
+        help="time to wait for the filesystem to be mounted (default is 10s)",
+    )
     parser.add_argument(
         "extra_args",
         nargs=argparse.REMAINDER,
@@ -82,29 +162,31 @@ def run():
             stdout=subprocess.DEVNULL,
             stderr=subprocess.DEVNULL,
         )
-    # Create mountpoint
-    mountpoint = None
+    # Mount, or reuse a mountpoint
+    registry = MountRegistry()
+    command = mount_command(binary, args.extra_args)
     parent_folder = Path.cwd() if args.pwd else Path.home()
-    with TemporaryDirectory(
-        prefix=f"ezmount-{binary}-", dir=str(parent_folder)
-    ) as tempdir:
-        mountpoint = Path(tempdir)
-    mountpoint.mkdir()
-    print(
-        Icons.HINT,
-        "Using mountpoint",
-        Label.folder(mountpoint),
-    )
-    # Mount
     try:
-        execute(binary, *args.extra_args, mountpoint)
+        mountpoint = mount(registry, command, parent_folder, timeout=args.timeout)
     except BaseException as error:  # pylint: disable=broad-except
         print(Label.error(error, message="Error while mounting"))
-        # In case of error, try to remove the mountpoint
-        print(Icons.HINT, "Remove mountpoint", Label.folder(mountpoint))
-        mountpoint.rmdir()
         sys.exit(2)
 
+    # Non interactive mode
+    if args.exec is not None:
+        try:
+            process = execute(
+                os.getenv("SHELL", "sh"),
+                "-c",
+                args.exec,
+                cwd=mountpoint,
+                check_rc=False,
+                extra_env={"EZMNT": str(mountpoint)},
+            )
+        finally:
+            umount(registry, command, mountpoint)
+        sys.exit(process.returncode)
+
     mounted = True
     # Question loop
     actions = [a for a, _ in COMMMANDS]
@@ -126,11 +208,13 @@ def run():
         # Mount/Umount
         if action in ("q", "u"):
             if mounted:
-                execute("fusermount", "-u", "-z", mountpoint)
+                umount(registry, command, mountpoint)
                 mounted = False
         elif action in ("m", "o", "s"):
             if not mounted:
-                execute(binary, *args.extra_args, mountpoint)
+                mountpoint = mount(
+                    registry, command, parent_folder, timeout=args.timeout
+                )
                 mounted = True
 
         # Action open/shell
@@ -147,10 +231,10 @@ def run():
 
         # Handle end of loop to quit
         if action in ("x", "q"):
-            if not mounted:
-                print(Icons.HINT, "Remove mountpoint", Label.folder(mountpoint))
-                mountpoint.rmdir()
-            else:
+            if mounted:
+                # keep the mountpoint for a next ezfuse with the same arguments
+                with registry:
+                    registry.release(command)
                 print(Icons.HINT, "Keeping mountpoint", Label.folder(mountpoint))
                 print(
                     Icons.HINT,
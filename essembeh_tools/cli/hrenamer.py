@@ -1,12 +1,20 @@
 import hashlib
-import shutil
+import mmap
+import os
+import re
 from argparse import ONE_OR_MORE, ArgumentParser, ArgumentTypeError
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache, partial
+from importlib import import_module
+from importlib.util import find_spec
 from pathlib import Path
-from typing import Callable, Optional
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
+from .. import service
 from ..colors import Color, Icons, Label
-from ..filesystem import visit
+from ..filesystem import prefetch, read_chunks, visit
+from ..journal import Journal, Operation, apply
+from ..metrics import METRICS, add_metrics_arguments, setup_metrics
 from ..utils import guess_extension, parser_group, plural
 
 
@@ -17,12 +25,179 @@ def noslash(text: str):
     return text
 
 
+HASHED_BYTES = METRICS.counter("hashed_bytes_total", "Bytes read to compute hashes")
+HASH_TIME = METRICS.histogram("hash_duration_seconds", "Time spent hashing files")
+
+# large reads let hashlib release the GIL while hashing
+BUFFER_SIZE = 1024 * 1024
+# page aligned reads are required by O_DIRECT
+assert BUFFER_SIZE % mmap.PAGESIZE == 0
+
+
+def optional_algorithm(module: str, name: str) -> Optional[Callable]:
+    """
+    hash constructor from an optional module, imported on first use
+    """
+    if find_spec(module) is None:
+        return None
+    return lambda: getattr(import_module(module), name)()
+
+
+ALGORITHMS: Dict[str, Callable] = {
+    name: partial(hashlib.new, name)
+    for name in ("md5", "sha1", "sha224", "sha256", "sha384", "sha512")
+}
+# blake2b outruns sha2 on cpus without sha extensions, 128 bits are enough to
+# rename files and keep names as short as md5 ones
+ALGORITHMS["blake2b"] = partial(hashlib.blake2b, digest_size=16)
+for name, hfunc in (
+    ("xxh3", optional_algorithm("xxhash", "xxh3_128")),
+    ("blake3", optional_algorithm("blake3", "blake3")),
+):
+    if hfunc is not None:
+        ALGORITHMS[name] = hfunc
+
+# prefix of fingerprints from non legacy algorithms, so that digests of the
+# same length from different algorithms cannot be mistaken for one another
+PREFIXES = {"blake2b": "b2-", "xxh3": "xxh3-", "blake3": "b3-"}
+
+# manifest tags, as named by cksum, default is the uppercase algorithm name
+TAGS = {"blake2b": "BLAKE2b-128", "xxh3": "XXH3-128"}
+
+# a digest in a filename template, like {sha256} or {sha256:12} to truncate it
+TEMPLATE_FIELD = re.compile(r"\{(?P<algo>[a-z0-9_]+)(?::(?P<length>[0-9]+))?\}")
+
+
+def compute_hashes(
+    hfuncs: Dict[str, Callable],
+    file: Path,
+    direct: bool = False,
+    drop_cache: bool = False,
+    next_file: Optional[Path] = None,
+) -> Dict[str, str]:
+    """
+    compute several digests of a file, reading it only once, and start
+    reading the next file to hash
+    """
+    algos = {name: hfunc() for name, hfunc in hfuncs.items()}
+    if next_file is not None:
+        prefetch(next_file)
+    with HASH_TIME.time():
+        for chunk in read_chunks(
+            file, BUFFER_SIZE, direct=direct, drop_cache=drop_cache
+        ):
+            for algo in algos.values():
+                algo.update(chunk)
+            HASHED_BYTES.inc(len(chunk))
+    return {name: algo.hexdigest() for name, algo in algos.items()}
+
+
+def cached_hashes(hfuncs: Dict[str, Callable], file: Path, **kwargs) -> Dict[str, str]:
+    """
+    compute the digests not cached by the server when the tool is run by one
+    """
+    if not service.available():
+        return compute_hashes(hfuncs, file, **kwargs)
+    key = service.file_key(file)
+    digests = service.call("cache_get", "digests", key) or {}
+    missing = {name: hfunc for name, hfunc in hfuncs.items() if name not in digests}
+    if len(missing) > 0:
+        digests.update(compute_hashes(missing, file, **kwargs))
+        service.call("cache_put", "digests", key, digests)
+    return {name: digests[name] for name in hfuncs}
+
+
 def compute_hash(hfunc: Callable, file: Path) -> str:
-    algo = hfunc()
-    with file.open("rb") as file_fd:
-        for chunk in iter(lambda: file_fd.read(4096), b""):
-            algo.update(chunk)
-    return algo.hexdigest()
+    return compute_hashes({"hash": hfunc}, file)["hash"]
+
+
+def shard(text: str) -> Tuple[int, int]:
+    """
+    parse a shard layout N:W, N levels of folders named with W chars
+    """
+    matcher = re.fullmatch(r"(?P<levels>[0-9]+):(?P<width>[0-9]+)", text)
+    if (
+        matcher is None
+        or int(matcher.group("levels")) * int(matcher.group("width")) == 0
+    ):
+        print(Color.RED(f"Invalid shard layout '{text}', expected N:W like 2:2"))
+        raise ArgumentTypeError()
+    return int(matcher.group("levels")), int(matcher.group("width"))
+
+
+def shard_folder(folder: Path, digest: str, layout: Tuple[int, int]) -> Path:
+    """
+    subfolder of a digest, like ab/cd/ for abcdef... with a 2:2 layout
+    """
+    levels, width = layout
+    assert len(digest) >= levels * width, f"Digest too short to shard: {digest}"
+    return folder.joinpath(
+        *(digest[i * width : (i + 1) * width] for i in range(levels))
+    )
+
+
+def unshard_folder(folder: Path, digest: str, layout: Tuple[int, int]) -> Path:
+    """
+    the folder containing the shards when the folder is already the subfolder
+    of the digest, else the folder itself
+    """
+    levels, _ = layout
+    if len(folder.parts) >= levels:
+        root = folder.parents[levels - 1]
+        if shard_folder(root, digest, layout) == folder:
+            return root
+    return folder
+
+
+@lru_cache(maxsize=None)
+def folder_content(folder: Path) -> Set[str]:
+    """
+    names in a folder, listed once instead of testing each target
+    """
+    try:
+        return set(os.listdir(folder))
+    except FileNotFoundError:
+        return set()
+
+
+def template(text: str) -> str:
+    """
+    check a filename template and the algorithms it uses
+    """
+    noslash(text)
+    if TEMPLATE_FIELD.search(text) is None:
+        print(Color.RED(f"Template '{text}' does not contain any digest"))
+        raise ArgumentTypeError()
+    for algo in template_algorithms(text):
+        if algo not in ALGORITHMS:
+            print(Color.RED(f"Unknown algorithm '{algo}' in '{text}'"))
+            raise ArgumentTypeError()
+    return text
+
+
+def template_algorithms(text: str) -> List[str]:
+    return list(dict.fromkeys(m.group("algo") for m in TEMPLATE_FIELD.finditer(text)))
+
+
+def render_template(text: str, digests: Dict[str, str]) -> str:
+    """
+    replace each digest field of the template
+    """
+    return TEMPLATE_FIELD.sub(
+        lambda m: digests[m.group("algo")][: int(m.group("length") or 0) or None],
+        text,
+    )
+
+
+def write_manifest(manifest: Path, digests: Dict[Path, Dict[str, str]]):
+    """
+    write all digests in the BSD tagged format, which can be checked with
+    cksum --check or sha256sum --check (cksum does not know xxh3 nor blake3)
+    """
+    with manifest.open("w", encoding="utf8") as fp:
+        for file, file_digests in sorted(digests.items()):
+            for algo, digest in file_digests.items():
+                fp.write(f"{TAGS.get(algo, algo.upper())} ({file}) = {digest}\n")
 
 
 def compute_filename(
@@ -64,23 +239,50 @@ def run():
         help="parallel jobs",
     )
     with parser_group(parser, exclusive=True) as group:
-        for hlabel, hfunc in (
-            ("md5", hashlib.md5),
-            ("sha1", hashlib.sha1),
-            ("sha224", hashlib.sha224),
-            ("sha256", hashlib.sha256),
-            ("sha384", hashlib.sha384),
-            ("sha512", hashlib.sha512),
-        ):
+        for hlabel in ALGORITHMS:
             group.add_argument(
                 f"--{hlabel}",
-                dest="hfunc",
+                dest="template",
                 action="store_const",
-                const=hfunc,
-                default=hashlib.md5,
+                const=f"{PREFIXES.get(hlabel, '')}{{{hlabel}}}",
+                default="{md5}",
                 help=f"use {hlabel} to compute file fingerprint",
             )
+        group.add_argument(
+            "-t",
+            "--template",
+            dest="template",
+            type=template,
+            metavar="TEMPLATE",
+            help="build fingerprint from a template using several digests, like {md5}-{sha256:12}",
+        )
+    parser.add_argument(
+        "-H",
+        "--hash",
+        dest="hashes",
+        action="append",
+        choices=ALGORITHMS.keys(),
+        default=[],
+        metavar="ALGO",
+        help="compute another digest, stored in the manifest",
+    )
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        metavar="FILE",
+        help="write all digests of renamed files to FILE",
+    )
 
+    parser.add_argument(
+        "--keep-cache",
+        action="store_true",
+        help="keep hashed files in the page cache, which is spared by default",
+    )
+    parser.add_argument(
+        "--direct",
+        action="store_true",
+        help="read files with O_DIRECT, bypassing the page cache",
+    )
     parser.add_argument(
         "-r",
         "--recursive",
@@ -127,79 +329,147 @@ def run():
         type=Path,
         help="rename files in specific folder",
     )
+    parser.add_argument(
+        "--shard",
+        type=shard,
+        metavar="N:W",
+        help="put files in N levels of subfolders named with W chars of the digest, like ab/cd/ for 2:2",
+    )
+    parser.add_argument(
+        "--journal",
+        type=Path,
+        metavar="FILE",
+        help="write planned operations and their status to FILE, see journal command to resume or rollback",
+    )
     parser.add_argument(
         "files",
         nargs=ONE_OR_MORE,
         type=Path,
         help="files to rename",
     )
+    add_metrics_arguments(parser)
     args = parser.parse_args()
+    setup_metrics(args)
 
     count_already_named, count_error, count_renamed = 0, 0, 0
 
-    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+    if args.length > 0:
+        # truncate digests, not the prefixes
+        args.template = TEMPLATE_FIELD.sub(
+            lambda m: m.group(0)
+            if m.group("length") is not None
+            else f"{{{m.group('algo')}:{args.length}}}",
+            args.template,
+        )
+    hfuncs = {
+        algo: ALGORITHMS[algo]
+        for algo in template_algorithms(args.template) + args.hashes
+    }
+    plan, targets, digests = [], set(), {}
+    files = list(visit(args.files, recursive=args.recursive, verbose=args.verbose))
+    workers = args.jobs or min(32, (os.cpu_count() or 1) + 4)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
         jobs = {
-            executor.submit(compute_hash, args.hfunc, f): f
-            for f in visit(args.files, recursive=args.recursive, verbose=args.verbose)
+            executor.submit(
+                cached_hashes,
+                hfuncs,
+                f,
+                direct=args.direct,
+                drop_cache=not args.keep_cache,
+                # file hashed when this one is done
+                next_file=files[i + workers] if i + workers < len(files) else None,
+            ): f
+            for i, f in enumerate(files)
         }
-        for job in as_completed(jobs):
-            source = jobs[job]
-            fingerprint = job.result()
-            extension = None
-            if args.ext:
-                extension = source.suffix
-            elif args.auto_ext:
-                extension = guess_extension(source)
-
-            newfilename = compute_filename(
-                fingerprint,
-                length=args.length,
-                prefix=args.prefix,
-                suffix=args.suffix,
-                extension=extension,
-            )
+        try:
+            for job in as_completed(jobs):
+                source = jobs[job]
+                file_digests = job.result()
+                fingerprint = render_template(args.template, file_digests)
+                extension = None
+                if args.ext:
+                    extension = source.suffix
+                elif args.auto_ext:
+                    extension = guess_extension(source)
 
-            assert len(newfilename) > 0
-            target = (args.folder or source.parent) / newfilename
-
-            if source == target:
-                count_already_named += 1
-                if args.verbose:
-                    print(Icons.OK, f"{Label.file(source)} is already renamed")
-            elif target.exists():
-                count_error += 1
-                print(
-                    Icons.RED_FLAG,
-                    f"{Label.file(source)} cannot be renamed {Label.file(target)}:",
-                    Color.RED("destination already exists"),
+                newfilename = compute_filename(
+                    fingerprint,
+                    prefix=args.prefix,
+                    suffix=args.suffix,
+                    extension=extension,
                 )
-            elif args.dryrun:
-                count_renamed += 1
-                print(
-                    Icons.DRYRUN,
-                    f"{Label.file(source)} would be renamed {Label.file(target)}",
-                    Color.CYAN("(dryrun)"),
-                )
-            else:
-                try:
-                    if not target.parent.exists():
-                        target.parent.mkdir(parents=True)
-                    shutil.move(source, target)
+
+                assert len(newfilename) > 0
+                folder = args.folder or source.parent
+                if args.shard is not None:
+                    digest = file_digests[template_algorithms(args.template)[0]]
+                    if args.folder is None:
+                        # do not shard again files renamed in place
+                        folder = unshard_folder(folder, digest, args.shard)
+                    folder = shard_folder(folder, digest, args.shard)
+                target = folder / newfilename
+
+                if source == target:
+                    count_already_named += 1
+                    digests[source] = file_digests
+                    if args.verbose:
+                        print(Icons.OK, f"{Label.file(source)} is already renamed")
+                elif target in targets or target.name in folder_content(folder):
+                    count_error += 1
+                    print(
+                        Icons.RED_FLAG,
+                        f"{Label.file(source)} cannot be renamed {Label.file(target)}:",
+                        Color.RED("destination already exists"),
+                    )
+                else:
+                    targets.add(target)
+                    plan.append(Operation("move", source, target))
+                    digests[target] = file_digests
+        except KeyboardInterrupt:
+            executor.shutdown(wait=False, cancel_futures=True)
+            exit(1)
+
+    journal = None
+    if args.journal is not None:
+        journal = Journal(args.journal)
+        journal.save(plan)
+        print(
+            f"Save {len(plan)} {plural('operation', len(plan))} in {Label.file(args.journal)}"
+        )
+
+    if args.dryrun:
+        for operation in plan:
+            count_renamed += 1
+            print(
+                Icons.DRYRUN,
+                f"{Label.file(operation.source)} would be renamed {Label.file(operation.dest)}",
+                Color.CYAN("(dryrun)"),
+            )
+    else:
+        try:
+            for operation, error in apply(plan, journal=journal):
+                if error is None:
                     count_renamed += 1
                     print(
                         Icons.OK,
-                        f"{Label.file(source)} was renamed {Label.file(target)}",
+                        f"{Label.file(operation.source)} was renamed {Label.file(operation.dest)}",
                     )
-                except KeyboardInterrupt:
-                    executor.shutdown(wait=False, cancel_futures=True)
-                    exit(1)
-                except BaseException as error:  # pylint: disable=broad-except
+                else:
                     count_error += 1
+                    del digests[operation.dest]
                     print(
                         Icons.BOOM,
-                        f"{Label.file(source)} cannot be renamed {Label.file(target)}:",
+                        f"{Label.file(operation.source)} cannot be renamed {Label.file(operation.dest)}:",
                         Label.error(error),
                     )
+        except KeyboardInterrupt:
+            exit(1)
+        # do not replace a previous manifest when nothing was renamed
+        if args.manifest is not None and len(digests) > 0:
+            write_manifest(args.manifest, digests)
+            print(
+                f"Save {len(digests)} {plural('digest', len(digests))} in {Label.file(args.manifest)}"
+            )
 
     if count_renamed:
         print(
@@ -38,5 +38,5 @@ def run():
     output_file = args.output or (Path.cwd() / f"{filename}.mp4")
     assert not output_file.exists()
 
-    create_video(args.folder, output_file, fps, filters=args.filters)
+    create_video(args.folder, output_file, fps, filters=args.filters, progress=True)
     print(f"{Icons.OK} Created {Label.file(output_file)}")
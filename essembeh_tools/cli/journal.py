@@ -0,0 +1,94 @@
+"""
+journal - apply, resume or rollback a plan written by dispatch, hrenamer or date-renamer
+"""
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+
+from ..colors import Icons, Label
+from ..journal import DONE, Journal, apply, rollback
+from ..metrics import add_metrics_arguments, setup_metrics
+from ..utils import plural
+
+
+def run():
+    """
+    entrypoint
+    """
+    parser = ArgumentParser(
+        description="apply a journal written with --journal, resuming after a crash if needed"
+    )
+    parser.add_argument(
+        "-n",
+        "--dryrun",
+        action="store_true",
+        help="dry-run mode, do not change anything",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        metavar="THREADS",
+        default=1,
+        help="parallel jobs (default is 1)",
+    )
+    parser.add_argument(
+        "--rollback",
+        action="store_true",
+        help="revert the operations already done",
+    )
+    parser.add_argument("journal", type=Path, metavar="FILE", help="journal file")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    setup_metrics(args)
+
+    journal = Journal(args.journal)
+    operations, status = journal.load()
+    done = {i for i, s in status.items() if s == DONE}
+    print(
+        f"Load {len(operations)} {plural('operation', len(operations))} from {Label.file(args.journal)}, {len(done)} already done"
+    )
+
+    count_ok, count_error = 0, 0
+    try:
+        if args.dryrun:
+            for index, operation in enumerate(operations):
+                if (index in done) == args.rollback:
+                    count_ok += 1
+                    print(
+                        Icons.DRYRUN,
+                        f"{'revert ' if args.rollback else ''}{operation.action} {Label.file(operation.source)} to {Label.file(operation.dest)} (dryrun)",
+                    )
+        else:
+            results = (
+                rollback(journal)
+                if args.rollback
+                else apply(
+                    operations, journal, done=done, jobs=args.jobs, check_exists=True
+                )
+            )
+            for operation, error in results:
+                label = f"{'revert ' if args.rollback else ''}{operation.action} {Label.file(operation.source)} to {Label.file(operation.dest)}"
+                if error is None:
+                    count_ok += 1
+                    print(Icons.OK, label)
+                else:
+                    count_error += 1
+                    print(Icons.BOOM, f"cannot {label}: {Label.error(error)}")
+    except KeyboardInterrupt:
+        print(Icons.ERROR, "Process interrupted")
+
+    print()
+    if count_ok:
+        print(
+            "   ",
+            Icons.DRYRUN if args.dryrun else Icons.OK,
+            f"{count_ok} {plural('operation', count_ok)} {'would be ' if args.dryrun else ''}{'reverted' if args.rollback else 'applied'}",
+        )
+    if count_error:
+        print(
+            "   ",
+            Icons.ERROR,
+            f"{count_error} {plural('operation', count_error)} with error",
+        )
+        sys.exit(1)
@@ -0,0 +1,119 @@
+"""
+essembeh-tools - single entrypoint for all tools, with an optional server mode
+"""
+import argparse
+import sys
+import traceback
+from argparse import ArgumentParser
+from importlib import import_module
+from pathlib import Path
+from typing import List
+
+TOOLS = {
+    "batxaran": "batxaran",
+    "date-renamer": "date_renamer",
+    "dispatch": "dispatch",
+    "ezfuse": "ezfuse",
+    "hrenamer": "hrenamer",
+    "images-to-video": "images_to_video",
+    "journal": "journal",
+    "pyfdupes": "pyfdupes",
+    "video-thumbnails": "video_thumbnails",
+    "video-to-images": "video_to_images",
+    "virenamer": "virenamer",
+}
+
+
+def call(argv: List[str]) -> int:
+    """
+    run the tool given as first argument and return its exit code
+    """
+    tool, *_ = argv
+    module = import_module(f"{__package__}.{TOOLS[tool]}")
+    sys.argv = list(argv)
+    try:
+        module.run()
+    except SystemExit as error:
+        if error.code is None or isinstance(error.code, int):
+            return error.code or 0
+        print(error.code, file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 130
+    except Exception:  # pylint: disable=broad-except
+        traceback.print_exc()
+        return 1
+    finally:
+        # pylint: disable=import-outside-toplevel
+        from ..metrics import export_metrics
+
+        # the server processes exit without running atexit handlers
+        export_metrics()
+    return 0
+
+
+def run():
+    """
+    entrypoint
+    """
+    # busybox like invocation, using a symlink named like a tool
+    prog = Path(sys.argv[0]).name
+    if prog in TOOLS:
+        sys.exit(call([prog] + sys.argv[1:]))
+
+    # pylint: disable=import-outside-toplevel
+    from ..server import default_socket, forward
+
+    parser = ArgumentParser(description="run any tool of essembeh-tools")
+    parser.add_argument(
+        "--socket",
+        type=Path,
+        default=default_socket(),
+        metavar="PATH",
+        help=f"server socket (default is {default_socket()})",
+    )
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--server",
+        action="store_true",
+        help="start a server keeping an interpreter warm to run the tools",
+    )
+    group.add_argument(
+        "-r",
+        "--remote",
+        action="store_true",
+        help="run the tool on the server, standard input is not forwarded",
+    )
+    parser.add_argument("tool", nargs="?", choices=TOOLS.keys(), help="tool to run")
+    parser.add_argument(
+        "args", nargs=argparse.REMAINDER, help="arguments given to the tool"
+    )
+    args = parser.parse_args()
+
+    if args.server:
+        from ..colors import Icons, Label
+        from ..server import MemoryCache, Server
+        from .date_renamer import EXIFTOOL_POOL
+
+        def exiftool(*exiftool_args: str) -> str:
+            with EXIFTOOL_POOL.lease() as coprocess:
+                return coprocess.request(*exiftool_args)
+
+        # import all tools once, forked processes will not have to
+        for module in TOOLS.values():
+            import_module(f"{__package__}.{module}")
+        services = {"exiftool": exiftool, **MemoryCache().services()}
+        with Server(args.socket, call, services) as server:
+            print(Icons.OK, f"Listening on {Label.file(args.socket)}")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                args.socket.unlink()
+    elif args.tool is None:
+        parser.error("the following arguments are required: tool")
+    elif args.remote:
+        sys.exit(forward(args.socket, [args.tool] + args.args))
+    else:
+        sys.exit(call([args.tool] + args.args))
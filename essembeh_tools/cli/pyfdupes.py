@@ -5,23 +5,84 @@ command line interface
 import subprocess
 import sys
 from argparse import ZERO_OR_MORE, ArgumentParser
+from contextlib import nullcontext
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Iterable, List, Optional, TextIO, Tuple
 
 from ..colors import Icons, Label
 from ..external import ExternalTool
-from ..utils import parser_group
+from ..utils import parser_group, plural
 
 FDUPES = ExternalTool(
     "fdupes", check_arg="--version", common_args=["--recurse", "--noempty"]
 )
 
 
-def is_in_folder(file: Path, folders: Optional[List[Path]]) -> bool:
+# files removed by each worker task
+BATCH_SIZE = 256
+
+
+class KeepIndex:
     """
-    Check if a file is contained by any given folder
+    Set of keep folders, a file is in a keep folder if one of its parents is in
+    the set, which costs one lookup per parent instead of one test per folder
     """
-    return folders is not None and any(map(file.is_relative_to, folders))
+
+    def __init__(self, folders: Optional[Iterable[Path]]):
+        self.folders = frozenset(folders or ())
+
+    def __contains__(self, file: Path) -> bool:
+        return not self.folders.isdisjoint(file.parents)
+
+
+def remove_batch(files: List[Path]) -> List[Tuple[Path, Optional[OSError]]]:
+    out = []
+    for file in files:
+        try:
+            file.unlink()
+            out.append((file, None))
+        except OSError as error:
+            out.append((file, error))
+    return out
+
+
+def remove_files(
+    files: List[Path], jobs: int = 1, log: Optional[TextIO] = None
+) -> Tuple[int, int]:
+    """
+    remove files by batches on a pool of threads, log removed files and return
+    the count of files removed and of errors
+    """
+    # pylint: disable=import-outside-toplevel
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    from tqdm import tqdm
+
+    count_removed, count_error = 0, 0
+    with ThreadPoolExecutor(max_workers=jobs) as executor, tqdm(
+        total=len(files), unit="file", disable=None, leave=False
+    ) as progress:
+        futures = [
+            executor.submit(remove_batch, files[i : i + BATCH_SIZE])
+            for i in range(0, len(files), BATCH_SIZE)
+        ]
+        try:
+            for future in as_completed(futures):
+                for file, error in future.result():
+                    if error is None:
+                        count_removed += 1
+                        if log is not None:
+                            log.write(f"{file}\n")
+                    else:
+                        count_error += 1
+                        progress.write(f"{Icons.BOOM} {Label.error(error)}")
+                progress.update(len(future.result()))
+                if log is not None:
+                    log.flush()
+        except KeyboardInterrupt:
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+    return count_removed, count_error
 
 
 def find_duplicates(folders: List[Path], quiet: bool = False) -> List[Tuple[Path]]:
@@ -83,6 +144,20 @@ def run():
         action="store_true",
         help="if multiple copies found in keep folders, keep only first copy",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        metavar="THREADS",
+        default=1,
+        help="parallel jobs to delete files (default is 1)",
+    )
+    parser.add_argument(
+        "--log",
+        type=Path,
+        metavar="FILE",
+        help="append removed files to FILE",
+    )
     parser.add_argument(
         "-k",
         "--keep",
@@ -101,15 +176,17 @@ def run():
 
     args = parser.parse_args()
 
+    count_error = 0
     try:
         folders = list(args.folders)
         if args.keep is not None:
             folders += args.keep
+        keep = KeepIndex(args.keep)
         files_to_delete = []
         for duplicates in find_duplicates(folders, quiet=args.quiet):
-            keep_files = [f for f in duplicates if is_in_folder(f, args.keep)]
-            duplicated_files = [f for f in duplicates if f not in keep_files]
-            assert len(keep_files) + len(duplicated_files) == len(duplicates)
+            keep_files, duplicated_files = [], []
+            for file in duplicates:
+                (keep_files if file in keep else duplicated_files).append(file)
 
             if len(keep_files) == 0:
                 if args.verbose:
@@ -138,8 +215,25 @@ def run():
 
         if len(files_to_delete) > 0 and args.rm:
             print(Icons.TRASH, f"Remove {len(files_to_delete)} files")
-            for file in files_to_delete:
-                file.unlink()
+            with (
+                args.log.open("a", encoding="utf8")
+                if args.log is not None
+                else nullcontext()
+            ) as log:
+                count_removed, count_error = remove_files(
+                    files_to_delete, jobs=args.jobs, log=log
+                )
+            print(
+                "   ",
+                Icons.OK,
+                f"{count_removed} {plural('file', count_removed)} removed",
+            )
+            if count_error:
+                print(
+                    "   ",
+                    Icons.BOOM,
+                    f"{count_error} {plural('error', count_error)}",
+                )
 
     except KeyboardInterrupt:
         print(Icons.ERROR, "Process interrupted")
@@ -147,4 +241,4 @@ def run():
     except BaseException as error:  # pylint: disable=broad-except
         print(Icons.BOOM, Label.error(error, message="Error"))
         raise error
-    sys.exit(0)
+    sys.exit(1 if count_error else 0)
@@ -0,0 +1,139 @@
+"""
+video-thumbnails - build a mosaic of thumbnails for each video
+"""
+import os
+from argparse import ONE_OR_MORE, ArgumentParser
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from ..colors import Icons, Label
+from ..ffmpeg import Position, create_mosaic
+from ..filesystem import visit
+from ..images import resolution_parse
+from ..utils import get_mimes, plural
+
+
+def run():
+    """
+    entrypoint
+    """
+    parser = ArgumentParser(description="build a mosaic of thumbnails for videos")
+    parser.add_argument(
+        "-o", "--output", type=Path, help="output folder (default is video folder)"
+    )
+    parser.add_argument(
+        "-r",
+        "--recursive",
+        action="store_true",
+        help="visit folder content",
+    )
+    parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="overwrite existing mosaics",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        metavar="THREADS",
+        default=max(1, (os.cpu_count() or 1) // 2),
+        help="videos processed in parallel (default is half the cpu count)",
+    )
+    mosaic_group = parser.add_argument_group("mosaic options")
+    mosaic_group.add_argument(
+        "-g",
+        "--grid",
+        type=resolution_parse,
+        default=(4, 4),
+        metavar="COLUMNSxROWS",
+        help="thumbnails per row and column (default is 4x4)",
+    )
+    mosaic_group.add_argument(
+        "-w",
+        "--width",
+        type=int,
+        default=320,
+        help="thumbnail width (default is 320)",
+    )
+    mosaic_group.add_argument(
+        "--start",
+        type=Position,
+        metavar="POSITION",
+        help="start position (examples: 42, 2:12, 3%%, -40%%)",
+    )
+    mosaic_group.add_argument(
+        "--end",
+        type=Position,
+        metavar="POSITION",
+        help="end position (examples: 42, 2:12, 3%%, -40%%)",
+    )
+    parser.add_argument("videos", nargs=ONE_OR_MORE, type=Path, help="videos")
+    args = parser.parse_args()
+
+    if args.output is not None:
+        args.output.mkdir(parents=True, exist_ok=True)
+
+    count_ok, count_skipped, count_error = 0, 0, 0
+    jobs, outputs = {}, set()
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        for video, mime in get_mimes(
+            visit(args.videos, recursive=args.recursive)
+        ).items():
+            if not mime.startswith("video/"):
+                continue
+            output = (args.output or video.parent) / f"{video.stem}.mosaic.jpg"
+            if output in outputs:
+                # videos with the same stem in the output folder
+                count_error += 1
+                print(
+                    Icons.BOOM,
+                    f"cannot create mosaic for {Label.file(video)}: {Label.file(output)} is used by another video",
+                )
+                continue
+            outputs.add(output)
+            if output.exists() and not args.force:
+                count_skipped += 1
+                print(Icons.RED_FLAG, f"{Label.file(output)} already exists")
+                continue
+            job = executor.submit(
+                create_mosaic,
+                video,
+                output,
+                grid=args.grid,
+                width=args.width,
+                start=args.start,
+                end=args.end,
+            )
+            jobs[job] = video
+        try:
+            for job in as_completed(jobs):
+                video = jobs[job]
+                if job.exception() is None:
+                    count_ok += 1
+                    print(
+                        Icons.OK,
+                        f"{Label.file(job.result())} created for {Label.file(video)}",
+                    )
+                else:
+                    count_error += 1
+                    print(
+                        Icons.BOOM,
+                        f"cannot create mosaic for {Label.file(video)}: {Label.error(job.exception())}",
+                    )
+        except KeyboardInterrupt:
+            executor.shutdown(wait=False, cancel_futures=True)
+            exit(1)
+
+    print()
+    if count_ok:
+        print("   ", Icons.OK, f"{count_ok} {plural('mosaic', count_ok)} created")
+    if count_skipped:
+        print(
+            "   ",
+            Icons.RED_FLAG,
+            f"{count_skipped} {plural('mosaic', count_skipped)} already exist",
+        )
+    if count_error:
+        print("   ", Icons.BOOM, f"{count_error} {plural('error', count_error)}")
@@ -1,9 +1,6 @@
 from argparse import ArgumentParser
 from pathlib import Path
 
-from PIL import Image
-from tqdm import tqdm
-
 from ..colors import Icons, Label
 from ..ffmpeg import Position, extract_frames, get_video_fps
 from ..images import CropFill, Resize, resolution_parse
@@ -51,9 +48,15 @@ def run():
 
     output_folder = args.output or (Path.cwd() / f"{args.video.stem} ({fps:.2f}fps)")
     print(f"Extract frames to {Label.folder(output_folder)} ...")
-    frames = extract_frames(args.video, output_folder, args.start, args.end, fps)
+    frames = extract_frames(
+        args.video, output_folder, args.start, args.end, fps, progress=True
+    )
     print(f"{Icons.OK} {len(frames)} frames extracted")
     if args.resize is not None:
+        # pylint: disable=import-outside-toplevel
+        from PIL import Image
+        from tqdm import tqdm
+
         print(f"Resize frames: {args.resize}")
         for frame in tqdm(frames, unit="frame"):
             with Image.open(frame) as img:
@@ -1,36 +1,119 @@
 """
 virenamer
 """
+import os
 import subprocess
 import sys
-from argparse import ONE_OR_MORE, ArgumentParser
+from argparse import ZERO_OR_MORE, ArgumentParser
+from itertools import groupby
 from os import getenv
 from pathlib import Path
+from re import fullmatch
 from shutil import rmtree
 from tempfile import NamedTemporaryFile
-from typing import List, Optional
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Tuple
+from uuid import uuid4
 
 from ..colors import Color, Label
+from ..utils import parser_group, plural
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
 
 DEFAULT_EDITOR = getenv("EDITOR", "vim")
 
 
+def snapshot(paths: Iterable[Path]) -> Set[Path]:
+    """
+    list each parent folder once to know which of the given paths exist
+    """
+    out = set()
+    for folder, names in groupby(
+        sorted(paths, key=lambda p: p.parent), key=lambda p: p.parent
+    ):
+        try:
+            existing = set(os.listdir(folder))
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        out.update(p for p in names if p.name in existing)
+    return out
+
+
+def plan_chains(renames: Dict[Path, Path]) -> List[List[Tuple[Path, Path, Path]]]:
+    """
+    split the renames in independent chains, each chain is ordered so that no
+    destination is used before its current file is renamed, cycles (like swaps)
+    are broken with a temporary name.
+    Return chains of (current path, new path, original source)
+    """
+    out = []
+    incoming = {dest: source for source, dest in renames.items()}
+    pending = dict(renames)
+
+    def unroll(source: Optional[Path], current: Path, chain: List):
+        # rename the chain of files ending with the given source
+        while source is not None and source in pending:
+            chain.append((current, pending.pop(source), source))
+            source = incoming.get(source)
+            current = source
+        return chain
+
+    # start from the files whose destination is free
+    for source in [s for s, d in renames.items() if d not in renames]:
+        out.append(unroll(source, source, []))
+    # remaining files are in cycles
+    while len(pending) > 0:
+        source = next(iter(pending))
+        tmp = source.with_name(f".{source.name}.{uuid4().hex[0:8]}")
+        dest = pending.pop(source)
+        chain = unroll(
+            incoming.get(source), incoming.get(source), [(source, tmp, source)]
+        )
+        chain.append((tmp, dest, source))
+        out.append(chain)
+    return out
+
+
+def plan_renames(renames: Dict[Path, Path]) -> List[Tuple[Path, Path, Path]]:
+    """
+    same as plan_chains, as a single list
+    """
+    return [step for chain in plan_chains(renames) for step in chain]
+
+
+def remove(path: Path):
+    if path.is_dir() and not path.is_symlink():
+        rmtree(path)
+    else:
+        path.unlink()
+
+
+def rename_chain(chain: List[Tuple[Path, Path, Path]]):
+    for current, new, _ in chain:
+        current.rename(new)
+
+
 def bulk_rename(
     sources: List[Path],
     destinations: List[Optional[Path]],
     delete: bool = False,
     dryrun: bool = False,
     force: bool = False,
+    jobs: Optional[int] = 1,
+    trash: Optional[Path] = None,
 ):
     """
-    function that renames the source files to destination files given the options
+    function that renames the source files to destination files given the options,
+    deletions and independent renames are run on a pool of workers, raise an
+    error once all of them are done if any failed
     """
 
     assert len(sources) == len(
         destinations
     ), "File count has changed, cannot rename any file"
 
-    # iterate the two lists
+    # handle deletions first, they free some destinations
+    deleted = set()
     for source, dest in zip(sources, destinations):
         if dest is None:
             if not delete:
@@ -43,32 +126,138 @@ def bulk_rename(
             elif dryrun:
                 # dryrun mode
                 print(Color.MAGENTA(f"(dryrun) Delete '{source}'"))
+                deleted.add(source)
             else:
-                # delete the source
-                print(Color.GREEN(f"Delete '{source}'"))
-                if source.is_dir():
-                    rmtree(source)
+                deleted.add(source)
+
+    renames, targets, conflicts = {}, set(), set()
+    for source, dest in zip(sources, destinations):
+        if dest is not None and source != dest:
+            if dest in targets:
+                conflicts.add(dest)
+            targets.add(dest)
+            renames[source] = dest
+    for source, dest in list(renames.items()):
+        if dest in conflicts:
+            print(
+                Color.RED(
+                    f"'{dest}' is the destination of multiple files, skip renaming '{source}'"
+                )
+            )
+            del renames[source]
+
+    # destinations are free if they do not exist or if they are renamed too
+    existing = snapshot(renames.values())
+    while not force:
+        skipped = [
+            (s, d)
+            for s, d in renames.items()
+            if d in existing and d not in renames and d not in deleted
+        ]
+        if len(skipped) == 0:
+            break
+        for source, dest in skipped:
+            # file already exists
+            print(
+                Color.RED(
+                    f"'{dest}' already exists, skip renaming, use --force to overwrite'{source}'"
+                )
+            )
+            del renames[source]
+
+    if dryrun:
+        for source, dest in renames.items():
+            # dryrun mode
+            print(Color.MAGENTA(f"(dryrun) Rename '{source}' --> '{dest}'"))
+        return
+
+    # pylint: disable=import-outside-toplevel
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    from tqdm import tqdm
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor, tqdm(
+        total=len(deleted) + len(renames), unit="file", disable=None, leave=False
+    ) as progress:
+        failures = 0
+
+        def wait(futures: Dict["Future", str]):
+            nonlocal failures
+            for future in as_completed(futures):
+                progress.update()
+                if future.exception() is None:
+                    progress.write(Color.GREEN(futures[future]))
                 else:
-                    source.unlink()
-        else:
-            if source == dest:
-                # same source/dest, skip
-                pass
-            elif dest.exists() and not force:
-                # file already exists
-                print(
-                    Color.RED(
-                        f"'{dest}' already exists, skip renaming, use --force to overwrite'{source}'"
-                    )
+                    failures += 1
+                    progress.write(Label.error(future.exception(), futures[future]))
+
+        # move deleted files to trash to delete them in background
+        background = {}
+        if trash is not None and len(deleted) > 0:
+            trash.mkdir(parents=True, exist_ok=True)
+            for source in list(deleted):
+                try:
+                    tmp = trash / f"{uuid4().hex}-{source.name}"
+                    source.rename(tmp)
+                    background[executor.submit(remove, tmp)] = f"Delete '{source}'"
+                    deleted.remove(source)
+                except OSError:
+                    # trash is not on the same filesystem
+                    pass
+        wait({executor.submit(remove, s): f"Delete '{s}'" for s in deleted})
+
+        # create all missing folders at once
+        for folder in sorted({d.parent for d in renames.values()}):
+            folder.mkdir(parents=True, exist_ok=True)
+        wait(
+            {
+                executor.submit(rename_chain, chain): "\n".join(
+                    f"Rename '{s}' --> '{n}'" for _, n, s in chain if renames[s] == n
                 )
-            elif dryrun:
-                # dryrun mode
-                print(Color.MAGENTA(f"(dryrun) Rename '{source}' --> '{dest}'"))
-            else:
-                # rename the file
-                print(Color.GREEN(f"Rename '{source}' --> '{dest}'"))
-                dest.parent.mkdir(parents=True, exist_ok=True)
-                source.rename(dest)
+                for chain in plan_chains(renames)
+            }
+        )
+        wait(background)
+    if failures > 0:
+        raise OSError(f"Cannot delete or rename {failures} {plural('file', failures)}")
+
+
+def parse_ids(
+    lines: Iterable[str], input_files: List[Path]
+) -> Tuple[List[Path], List[Optional[Path]]]:
+    """
+    parse lines prefixed with the index of their file, lines can be removed or
+    reordered, removed lines are left unchanged
+    """
+    sources, destinations, seen = [], [], set()
+    for line in filter(lambda l: len(l.strip()) > 0, lines):
+        matcher = fullmatch(r"(?P<index>[0-9]+)(\t(?P<path>.*))?", line)
+        assert matcher is not None, f"Invalid line, cannot find file index: {line}"
+        index = int(matcher.group("index"))
+        assert 0 < index <= len(input_files), f"Invalid file index {index}"
+        assert index not in seen, f"File index {index} is used multiple times"
+        seen.add(index)
+        source = input_files[index - 1]
+        path = (matcher.group("path") or "").strip()
+        sources.append(source)
+        destinations.append(Path(path) if len(path) > 0 else None)
+    return sources, destinations
+
+
+def parse_script(lines: Iterable[str]) -> Tuple[List[Path], List[Optional[Path]]]:
+    """
+    parse lines like SOURCE<TAB>DEST, lines without DEST are deletions
+    """
+    sources, destinations = [], []
+    for line in filter(lambda l: len(l.strip()) > 0, lines):
+        source, _, dest = line.partition("\t")
+        source, dest = Path(source), dest.strip()
+        if source.exists():
+            sources.append(source)
+            destinations.append(Path(dest) if len(dest) > 0 else None)
+        else:
+            print(Color.RED(f"'{source}' does not exist, skip it"))
+    return sources, destinations
 
 
 def run():
@@ -95,35 +284,87 @@ def run():
     parser.add_argument(
         "-n", "--dryrun", action="store_true", help="dryrun mode, don't rename any file"
     )
-    parser.add_argument("files", nargs=ONE_OR_MORE, type=Path, help="files to rename")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        metavar="THREADS",
+        default=1,
+        help="parallel jobs to delete and rename files (default is 1)",
+    )
+    parser.add_argument(
+        "--trash",
+        type=Path,
+        metavar="DIR",
+        help="move deleted files to DIR, on the same filesystem, and delete them in background",
+    )
+    with parser_group(parser, exclusive=True) as group:
+        group.add_argument(
+            "-i",
+            "--ids",
+            action="store_true",
+            help="prefix lines with file index, so that lines can be removed or reordered",
+        )
+        group.add_argument(
+            "-s",
+            "--script",
+            action="store_true",
+            help="do not use editor, read SOURCE<TAB>DEST lines from stdin",
+        )
+    parser.add_argument("files", nargs=ZERO_OR_MORE, type=Path, help="files to rename")
     args = parser.parse_args()
+    if not args.script and len(args.files) == 0:
+        parser.error("the following arguments are required: files")
 
     try:
-        # filter existing files from input and avoid doublons
-        input_files = [f for f in dict.fromkeys(args.files) if f.exists()]
-        assert len(input_files) > 0, "No valid file to rename"
-
-        # edit the files list with editor
-        with NamedTemporaryFile() as tmp:
-            tmpfile = Path(tmp.name)
-            # write the file list to file
-            tmpfile.write_text("".join(f"{f}\n" for f in input_files), encoding="utf8")
-            # user edit the file list
-            subprocess.check_call([args.editor, tmp.name])
-            # read the new file list
-            output_files = [
-                Path(l)
-                if len(l.strip()) > 0
-                else None  # handle file delete with None destination
-                for l in tmpfile.read_text(encoding="utf8").splitlines()
-            ]
+        if args.script:
+            sources, destinations = parse_script(sys.stdin.read().splitlines())
+        else:
+            # filter existing files from input and avoid doublons
+            input_files = [f for f in dict.fromkeys(args.files) if f.exists()]
+            assert len(input_files) > 0, "No valid file to rename"
+
+            # edit the files list with editor
+            with NamedTemporaryFile() as tmp:
+                tmpfile = Path(tmp.name)
+                # write the file list to file
+                tmpfile.write_text(
+                    "".join(
+                        f"{i}\t{f}\n" if args.ids else f"{f}\n"
+                        for i, f in enumerate(input_files, start=1)
+                    ),
+                    encoding="utf8",
+                )
+                # user edit the file list
+                subprocess.check_call([args.editor, tmp.name])
+                # read the new file list
+                lines = tmpfile.read_text(encoding="utf8").splitlines()
+            if args.ids:
+                sources, destinations = parse_ids(lines, input_files)
+            else:
+                sources = input_files
+                destinations = [
+                    Path(l)
+                    if len(l.strip()) > 0
+                    else None  # handle file delete with None destination
+                    for l in lines
+                ]
+                assert len(sources) == len(
+                    destinations
+                ), "File count has changed, cannot rename any file"
+
+        # only process changed lines
+        changes = [(s, d) for s, d in zip(sources, destinations) if s != d]
+        if len(changes) > 0:
             # rename the files
             bulk_rename(
-                input_files,
-                output_files,
+                [s for s, _ in changes],
+                [d for _, d in changes],
                 delete=args.delete,
                 dryrun=args.dryrun,
                 force=args.force,
+                jobs=args.jobs,
+                trash=args.trash,
             )
     except BaseException as error:  # pylint: disable=broad-except
         print(Label.error(error, message="Error"), file=sys.stderr)
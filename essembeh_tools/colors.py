@@ -5,11 +5,12 @@ gnome-extensions-cli
 import shlex
 from enum import Enum
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import TYPE_CHECKING, List, Optional, Union
 
 from colorama import Back, Fore, Style
 
-from .external import ExternalToolCommand
+if TYPE_CHECKING:
+    from .external import ExternalToolCommand
 
 
 class Icons(Enum):
@@ -121,7 +122,7 @@ class Label:
         return out
 
     @staticmethod
-    def command(command: Union[str, List[str], ExternalToolCommand]) -> str:
+    def command(command: Union[str, List[str], "ExternalToolCommand"]) -> str:
         if isinstance(command, List):
             return Color.YELLOW(*map(shlex.quote, map(str, command)))
         return Color.YELLOW(command)
@@ -1,11 +1,38 @@
+import os
 import shlex
 from collections import UserList
 from contextlib import contextmanager
 from dataclasses import dataclass, field
 from functools import cached_property
 from os import environ
-from subprocess import DEVNULL, check_call, check_output, run
-from typing import Any, Generator, List, Optional
+from subprocess import (
+    DEVNULL,
+    PIPE,
+    CalledProcessError,
+    CompletedProcess,
+    Popen,
+    check_call,
+    check_output,
+    run,
+)
+from threading import Lock, local
+from typing import (
+    Any,
+    Callable,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from .metrics import METRICS
+
+SUBPROCESS_TIME = METRICS.histogram(
+    "subprocess_duration_seconds", "Time spent running external tools"
+)
 
 
 class ExternalToolCommand(UserList):
@@ -21,13 +48,163 @@ class ExternalToolCommand(UserList):
             self += args
 
     def check_call(self, **kwargs):
-        return check_call(self.command, **kwargs)
+        with SUBPROCESS_TIME.time():
+            return check_call(self.command, **kwargs)
 
     def check_output(self, **kwargs):
-        return check_output(self.command, **kwargs)
+        with SUBPROCESS_TIME.time():
+            return check_output(self.command, **kwargs)
 
     def run(self, check: bool = False, **kwargs):
-        return run(self.command, check=check, **kwargs)
+        with SUBPROCESS_TIME.time():
+            return run(self.command, check=check, **kwargs)
+
+    async def run_async(self, check: bool = False, **kwargs) -> CompletedProcess:
+        """
+        asyncio variant of run, stdout and stderr are captured if set to PIPE
+        """
+        # pylint: disable=import-outside-toplevel
+        from asyncio import create_subprocess_exec
+
+        with SUBPROCESS_TIME.time():
+            process = await create_subprocess_exec(*self.command, **kwargs)
+            stdout, stderr = await process.communicate()
+        if check and process.returncode != 0:
+            raise CalledProcessError(process.returncode, self.command, stdout, stderr)
+        return CompletedProcess(self.command, process.returncode, stdout, stderr)
+
+    async def check_output_async(self, **kwargs) -> bytes:
+        """
+        asyncio variant of check_output
+        """
+        return (await self.run_async(check=True, stdout=PIPE, **kwargs)).stdout
+
+
+def arg_max() -> int:
+    """
+    maximum size of the arguments of a command, keeping room for the
+    environment and a safety margin like xargs does
+    """
+    env_size = sum(len(k) + len(v) + 2 + 8 for k, v in environ.items())
+    return os.sysconf("SC_ARG_MAX") - env_size - 2048
+
+
+def _arg_size(arg: Any) -> int:
+    # the string, its terminating null byte and its pointer in argv
+    return len(os.fsencode(str(arg))) + 1 + 8
+
+
+class CoProcess:
+    """
+    persistent process answering requests written on its standard input, one
+    argument per line, each response ending with a ready line on its standard
+    output
+    """
+
+    def __init__(
+        self,
+        command: Sequence[Any],
+        execute: Sequence[str],
+        ready: str,
+        close: Sequence[str] = (),
+    ):
+        self.command = [str(x) for x in command]
+        self.execute = list(execute)
+        self.ready = ready
+        self.close_args = list(close)
+        self.process: Optional[Popen] = None
+        self.lock = Lock()
+
+    def request(self, *args: Any) -> str:
+        """
+        send a request and return the response, without the ready line
+        """
+        lines = [str(x) for x in args] + self.execute
+        for line in lines:
+            if "\n" in line:
+                raise ValueError(f"Cannot send argument with a newline: {line!r}")
+        with self.lock, SUBPROCESS_TIME.time():
+            if self.process is None:
+                self.process = Popen(
+                    self.command,
+                    stdin=PIPE,
+                    stdout=PIPE,
+                    stderr=DEVNULL,
+                    encoding="utf8",
+                )
+            self.process.stdin.write("".join(f"{x}\n" for x in lines))
+            self.process.stdin.flush()
+            out = []
+            while (line := self.process.stdout.readline()) != "":
+                if line.rstrip("\n") == self.ready:
+                    return "".join(out)
+                out.append(line)
+            self.process.wait()
+            self.process = None
+            raise EOFError(f"{self.command[0]} exited unexpectedly")
+
+    def close(self):
+        with self.lock:
+            if self.process is not None:
+                try:
+                    self.process.stdin.write("".join(f"{x}\n" for x in self.close_args))
+                    self.process.stdin.close()
+                except BrokenPipeError:
+                    pass
+                self.process.wait()
+                self.process = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class CoProcessPool:
+    """
+    one co-process per thread, created on first use, or leased to short lived
+    threads which return it to the idle ones
+    """
+
+    def __init__(self, factory: Callable[[], CoProcess]):
+        self.factory = factory
+        self.local = local()
+        self.processes: List[CoProcess] = []
+        self.idle: List[CoProcess] = []
+        self.lock = Lock()
+
+    def _create(self) -> CoProcess:
+        out = self.factory()
+        with self.lock:
+            self.processes.append(out)
+        return out
+
+    def get(self) -> CoProcess:
+        out = getattr(self.local, "process", None)
+        if out is None:
+            out = self.local.process = self._create()
+        return out
+
+    @contextmanager
+    def lease(self) -> Generator[CoProcess, None, None]:
+        with self.lock:
+            out = self.idle.pop() if len(self.idle) > 0 else None
+        if out is None:
+            out = self._create()
+        try:
+            yield out
+        finally:
+            with self.lock:
+                self.idle.append(out)
+
+    def close(self):
+        with self.lock:
+            for process in self.processes:
+                process.close()
+            self.processes.clear()
+            self.idle.clear()
+        self.local = local()
 
 
 @dataclass
@@ -65,3 +242,27 @@ class ExternalTool:
     @contextmanager
     def with_command(self, *args) -> Generator[ExternalToolCommand, None, None]:
         yield self.command(*args)
+
+    def batches(
+        self, items: Iterable[Any], *args, max_args: Optional[int] = None
+    ) -> Iterator[Tuple[ExternalToolCommand, List[Any]]]:
+        """
+        split items in as few commands as possible, like xargs, and yield each
+        command with its items
+        """
+        base = self.command(*args)
+        limit = arg_max() - sum(map(_arg_size, base))
+        batch: List[Any] = []
+        size = 0
+        for item in items:
+            item_size = _arg_size(item)
+            if len(batch) > 0 and (
+                size + item_size > limit
+                or (max_args is not None and len(batch) >= max_args)
+            ):
+                yield ExternalToolCommand(base + batch), batch
+                batch, size = [], 0
+            batch.append(item)
+            size += item_size
+        if len(batch) > 0:
+            yield ExternalToolCommand(base + batch), batch
@@ -1,15 +1,17 @@
 """
-Video related utility functions
+Video related utility functions, ffmpeg-python and jsonpath-ng are imported
+only when needed to keep command line tools startup fast
 """
+# pylint: disable=import-outside-toplevel
 from dataclasses import dataclass
 from datetime import timedelta
 from pathlib import Path
 from re import fullmatch
-from typing import List
+from subprocess import DEVNULL, PIPE, Popen
+from threading import Thread
+from typing import Any, List
 
-import ffmpeg
-from jsonpath_ng.ext import parse
-from lazy_object_proxy import Proxy
+from . import service
 
 _POSITION_PATTERN = (
     r"(?P<minus>-)?"
@@ -49,11 +51,23 @@ class Position:
         return self.expression
 
 
+def probe(video: Path) -> dict:
+    """
+    use ffprobe to read the video streams and format, cached by the server when
+    the tool is run by one
+    """
+    import ffmpeg
+
+    return service.cached("ffprobe", video, lambda: ffmpeg.probe(video))
+
+
 def get_video_resolution(video: Path) -> tuple[int, int] | None:
     """
     use ffprobe to get the video resolution as tuple
     """
-    data = ffmpeg.probe(video)
+    from jsonpath_ng.ext import parse
+
+    data = probe(video)
     for match in parse("$.streams[?codec_type = 'video']").find(data):
         return (int(match.value["width"]), int(match.value["height"]))
 
@@ -62,7 +76,9 @@ def get_video_fps(video: Path) -> float | None:
     """
     use ffprobe to get the video fps
     """
-    data = ffmpeg.probe(video)
+    from jsonpath_ng.ext import parse
+
+    data = probe(video)
     for match in parse("$.streams[?codec_type = 'video'].r_frame_rate").find(data):
         value = match.value
         if value.isnumeric():
@@ -75,9 +91,61 @@ def get_video_duration(video: Path) -> float | None:
     """
     use ffprobe to get the video duration as float
     """
-    data = ffmpeg.probe(video)
+    from jsonpath_ng.ext import parse
+
+    data = probe(video)
     for match in parse("$.streams[?codec_type = 'video'].duration").find(data):
         return float(match.value)
+    # matroska and webm only store the duration of the container
+    if (duration := data.get("format", {}).get("duration")) is not None:
+        return float(duration)
+
+
+def run_with_progress(
+    stream: Any,
+    total: float | None = None,
+    quiet: bool = True,
+    progress: bool = False,
+    desc: str | None = None,
+) -> int:
+    """
+    run ffmpeg reading its -progress key=value stream to update a progress bar
+    in frames, return the number of frames written
+    """
+    import ffmpeg
+    from tqdm import tqdm
+
+    command = stream.global_args("-progress", "pipe:1", "-nostats").compile()
+    with Popen(
+        command, stdin=DEVNULL, stdout=PIPE, stderr=PIPE if quiet else None
+    ) as process:
+        # keep the error output to raise it, without blocking ffmpeg
+        errors: List[bytes] = []
+        if process.stderr is not None:
+            reader = Thread(target=lambda: errors.extend(process.stderr))
+            reader.start()
+        frames = 0
+        with tqdm(
+            total=round(total) if total is not None else None,
+            unit="frame",
+            desc=desc,
+            disable=not progress,
+        ) as pbar:
+            state = {}
+            for line in process.stdout:
+                key, _, value = line.decode(errors="replace").strip().partition("=")
+                state[key] = value
+                if key == "progress":
+                    if (frame := state.get("frame", "")).isdigit():
+                        frames = int(frame)
+                        pbar.update(frames - pbar.n)
+                    if (speed := state.get("speed", "N/A")) != "N/A":
+                        pbar.set_postfix(speed=speed.strip())
+        if process.stderr is not None:
+            reader.join()
+        if process.wait() != 0:
+            raise ffmpeg.Error("ffmpeg", b"", b"".join(errors))
+    return frames
 
 
 def extract_frame(
@@ -86,6 +154,9 @@ def extract_frame(
     """
     Extract a single frame from a video
     """
+    import ffmpeg
+    from lazy_object_proxy import Proxy
+
     duration = Proxy(lambda: get_video_duration(video))
     ffmpeg.input(
         video, ss=position.get_seconds(duration) if position is not None else 0
@@ -94,6 +165,44 @@ def extract_frame(
     return output
 
 
+def create_mosaic(
+    video: Path,
+    output: Path,
+    grid: tuple[int, int] = (4, 4),
+    width: int = 320,
+    start: Position | None = None,
+    end: Position | None = None,
+    quiet: bool = True,
+) -> Path:
+    """
+    Build a mosaic of evenly spaced frames in a single ffmpeg pass
+    """
+    import ffmpeg
+
+    duration = get_video_duration(video)
+    assert duration is not None, f"Cannot find duration of {video}"
+    begin = start.get_seconds(duration) if start is not None else 0
+    finish = end.get_seconds(duration) if end is not None else duration
+    assert begin < finish, f"Invalid range {begin}s to {finish}s"
+    columns, rows = grid
+    interval = (finish - begin) / (columns * rows)
+    run_with_progress(
+        ffmpeg.input(video, ss=begin, to=finish)
+        # keep the first frame and then one frame per interval
+        .filter(
+            "select",
+            f"isnan(prev_selected_t)+gte(t-prev_selected_t,{interval:.3f})",
+        )
+        .filter("scale", width, -2)
+        .filter("tile", f"{columns}x{rows}")
+        .output(str(output), vframes=1)
+        .overwrite_output(),
+        quiet=quiet,
+    )
+    assert output.exists()
+    return output
+
+
 def extract_frames(
     video: Path,
     output_folder: Path,
@@ -102,7 +211,11 @@ def extract_frames(
     fps: float | None = None,
     extension: str = "jpg",
     quiet: bool = True,
+    progress: bool = False,
 ) -> List[Path]:
+    import ffmpeg
+    from lazy_object_proxy import Proxy
+
     duration = Proxy(lambda: get_video_duration(video))
     output_folder.mkdir(parents=True, exist_ok=True)
     ffmpeg_kwargs = {}
@@ -110,6 +223,11 @@ def extract_frames(
         ffmpeg_kwargs["ss"] = start.get_seconds(duration)
     if end is not None:
         ffmpeg_kwargs["to"] = end.get_seconds(duration)
+    total = None
+    if progress and (rate := fps or get_video_fps(video)) is not None:
+        # expected frame count, only computed when displayed and known
+        if (to := ffmpeg_kwargs.get("to", duration.__wrapped__)) is not None:
+            total = (to - ffmpeg_kwargs.get("ss", 0)) * rate
     stream = ffmpeg.input(video, **ffmpeg_kwargs)
     if fps is not None:
         stream = stream.filter("fps", fps=fps)
@@ -118,16 +236,15 @@ def extract_frames(
     for f in output_folder.iterdir():
         if f.is_file() and fullmatch(r"[0-9]{8}." + extension, f.name) is not None:
             raise FileExistsError(f"File {f} already exists")
-    stream.output(f"{output_folder}/%08d.{extension}").overwrite_output().run(
-        quiet=quiet
-    )
-    return sorted(
-        [
-            f
-            for f in output_folder.iterdir()
-            if f.is_file() and fullmatch(r"[0-9]{8}." + extension, f.name) is not None
-        ]
+    frames = run_with_progress(
+        stream.output(f"{output_folder}/%08d.{extension}").overwrite_output(),
+        total=total,
+        quiet=quiet,
+        progress=progress,
+        desc="Extract",
     )
+    # the image muxer numbers frames from 1, no need to list the folder again
+    return [output_folder / f"{i:08}.{extension}" for i in range(1, frames + 1)]
 
 
 def create_video(
@@ -137,7 +254,10 @@ def create_video(
     extension: str = "jpg",
     filters: List[str] | None = None,
     quiet: bool = True,
+    progress: bool = False,
 ) -> Path:
+    import ffmpeg
+
     stream = ffmpeg.input(
         f"{frame_folder}/*.{extension}", pattern_type="glob", framerate=fps
     )
@@ -161,5 +281,11 @@ def create_video(
                 ", ".join(map(lambda x: f"{x[0]}={x[1]}", current_filter_args.items())),
             )
             stream = stream.filter(current_filter, **current_filter_args)
-    stream.output(str(output_file)).overwrite_output().run(quiet=quiet)
+    run_with_progress(
+        stream.output(str(output_file)).overwrite_output(),
+        total=len(list(frame_folder.glob(f"*.{extension}"))) if progress else None,
+        quiet=quiet,
+        progress=progress,
+        desc="Encode",
+    )
     return output_file
@@ -1,16 +1,28 @@
+import errno
+import mmap
+import os
+import shutil
 from pathlib import Path
-from typing import Iterable
+from typing import Callable, Dict, Iterable, Iterator
 
 from .colors import Color, Icons, Label
+from .metrics import METRICS
+
+VISITED_FILES = METRICS.counter("visited_files_total", "Files found in folders")
+STAT_TIME = METRICS.histogram("stat_duration_seconds", "Time spent in stat calls")
 
 
 def visit(
     files: Iterable[Path], recursive: bool = False, verbose: bool = False
 ) -> Iterable[Path]:
     for current in sorted(filter(lambda x: isinstance(x, Path), files)):
-        if current.is_file():
+        with STAT_TIME.time():
+            is_file = current.is_file()
+            is_dir = not is_file and current.is_dir()
+        if is_file:
+            VISITED_FILES.inc()
             yield current
-        elif current.is_dir():
+        elif is_dir:
             if recursive:
                 yield from visit(current.iterdir(), recursive=recursive)
             else:
@@ -24,3 +36,162 @@ def visit(
                 Icons.ERROR,
                 f"{Label.file(current)} is ignored, not a file nor a directory",
             )
+
+
+# errors of zero-copy syscalls when the files do not support them
+_UNSUPPORTED = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP)
+
+
+@METRICS.histogram("move_duration_seconds", "Time spent moving files").time()
+def move(source: Path, dest: Path, same_device: bool = False):
+    """
+    move a file without ever replacing the destination, a hard link fails
+    atomically if it exists where rename would silently replace it
+    """
+    if same_device:
+        try:
+            os.link(source, dest, follow_symlinks=False)
+        except OSError as error:
+            if error.errno not in (errno.EPERM, errno.EOPNOTSUPP, errno.EMLINK):
+                raise
+            # no hard links on this filesystem (vfat, some fuse), check first
+            if dest.exists() or dest.is_symlink():
+                raise FileExistsError(
+                    errno.EEXIST, os.strerror(errno.EEXIST), str(dest)
+                ) from error
+            os.rename(source, dest)
+            return
+        os.unlink(source)
+    else:
+        # the copy creates the destination exclusively
+        copy(source, dest)
+        shutil.copystat(source, dest)
+        os.unlink(source)
+
+
+def _kernel_copy(syscall: Callable, source_fd: int, dest_fd: int, size: int) -> bool:
+    """
+    copy without reading the data in userspace, return False if the syscall is
+    not supported for these files
+    """
+    copied = 0
+    try:
+        while copied < size:
+            count = syscall(source_fd, dest_fd, copied, size - copied)
+            if count == 0:
+                break
+            copied += count
+    except OSError as error:
+        if copied > 0 or error.errno not in _UNSUPPORTED:
+            raise
+        return False
+    return True
+
+
+@METRICS.histogram("copy_duration_seconds", "Time spent copying files").time()
+def copy(source: Path, dest: Path, same_device: bool = False):
+    """
+    copy the file content with copy_file_range when available, which lets the
+    filesystem do reflinks or server-side copies, else with sendfile, and
+    fallback to a regular copy
+    """
+    syscalls = []
+    if same_device and hasattr(os, "copy_file_range"):
+        syscalls.append(
+            lambda src, dst, offset, count: os.copy_file_range(
+                src, dst, count, offset, offset
+            )
+        )
+    if hasattr(os, "sendfile"):
+        syscalls.append(
+            lambda src, dst, offset, count: os.sendfile(dst, src, offset, count)
+        )
+    with source.open("rb") as source_fd, dest.open("xb") as dest_fd:
+        try:
+            size = os.fstat(source_fd.fileno()).st_size
+            if not any(
+                _kernel_copy(syscall, source_fd.fileno(), dest_fd.fileno(), size)
+                for syscall in syscalls
+            ):
+                shutil.copyfileobj(source_fd, dest_fd)
+        except BaseException:
+            # do not leave a partial copy behind
+            dest.unlink()
+            raise
+    shutil.copymode(source, dest)
+
+
+@METRICS.histogram("link_duration_seconds", "Time spent linking files").time()
+def link(source: Path, dest: Path, same_device: bool = False):
+    dest.symlink_to(source.resolve())
+
+
+ACTIONS: Dict[str, Callable[[Path, Path, bool], None]] = {
+    "move": move,
+    "copy": copy,
+    "link": link,
+}
+
+
+# bytes read ahead for files about to be read, not the whole file
+PREFETCH_SIZE = 8 * 1024 * 1024
+
+
+def advise(fd: int, advice: int, offset: int = 0, length: int = 0):
+    """
+    give a hint to the kernel about a file access pattern, when supported
+    """
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(fd, offset, length, advice)
+
+
+def prefetch(file: Path):
+    """
+    ask the kernel to start reading the beginning of a file
+    """
+    if hasattr(os, "posix_fadvise"):
+        try:
+            fd = os.open(file, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            advise(fd, os.POSIX_FADV_WILLNEED, 0, PREFETCH_SIZE)
+        finally:
+            os.close(fd)
+
+
+def read_chunks(
+    file: Path,
+    size: int = 1024 * 1024,
+    direct: bool = False,
+    drop_cache: bool = False,
+) -> Iterator[memoryview]:
+    """
+    read a file sequentially, reusing the same buffer for each chunk, with
+    O_DIRECT to bypass the page cache or dropping pages once read
+    """
+    flags = os.O_RDONLY
+    if direct and hasattr(os, "O_DIRECT"):
+        flags |= os.O_DIRECT
+    try:
+        fd = os.open(file, flags)
+    except OSError as error:
+        # some filesystems like tmpfs do not support O_DIRECT
+        if error.errno != errno.EINVAL or flags == os.O_RDONLY:
+            raise
+        fd = os.open(file, os.O_RDONLY)
+    try:
+        if hasattr(os, "posix_fadvise"):
+            advise(fd, os.POSIX_FADV_SEQUENTIAL)
+        # an anonymous mmap is page aligned, as required by O_DIRECT
+        with mmap.mmap(-1, size) as buffer:
+            offset = 0
+            while (count := os.readv(fd, [buffer])) > 0:
+                # the chunk is released before the buffer is reused
+                with memoryview(buffer)[:count] as chunk:
+                    yield chunk
+                if drop_cache and hasattr(os, "posix_fadvise"):
+                    advise(fd, os.POSIX_FADV_DONTNEED, offset, count)
+                offset += count
+    finally:
+        os.close(fd)
@@ -1,7 +1,9 @@
 from dataclasses import dataclass
 from re import fullmatch
+from typing import TYPE_CHECKING
 
-from PIL import Image, ImageOps
+if TYPE_CHECKING:
+    from PIL import Image
 
 
 def resolution_parse(value: str) -> tuple[int, int]:
@@ -23,7 +25,7 @@ class ImageFilter:
     Apply a filter on an image
     """
 
-    def apply(self, image: Image.Image) -> Image.Image:
+    def apply(self, image: "Image.Image") -> "Image.Image":
         return image
 
 
@@ -31,7 +33,7 @@ class ImageFilter:
 class Resize(ImageFilter):
     size: tuple[int, int]
 
-    def apply(self, image: Image.Image) -> Image.Image:
+    def apply(self, image: "Image.Image") -> "Image.Image":
         out = image.copy()
         out.thumbnail(self.size)
         return out
@@ -44,7 +46,9 @@ class Resize(ImageFilter):
 class CropFill(ImageFilter):
     size: tuple[int, int]
 
-    def apply(self, image: Image.Image) -> Image.Image:
+    def apply(self, image: "Image.Image") -> "Image.Image":
+        from PIL import ImageOps  # pylint: disable=import-outside-toplevel
+
         return ImageOps.fit(image, size=self.size)
 
     def __str__(self) -> str:
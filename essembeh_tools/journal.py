@@ -0,0 +1,208 @@
+"""
+Plan filesystem operations, journal them and apply them in bulk
+"""
+import json
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .filesystem import ACTIONS, move
+
+DONE = "done"
+ERROR = "error"
+UNDONE = "undone"
+
+
+@dataclass(frozen=True)
+class Operation:
+    """
+    a single planned operation: move, copy or link source to dest, with the
+    device check of the planner if any, it is not journaled
+    """
+
+    action: str
+    source: Path
+    dest: Path
+    same_device: Optional[bool] = field(default=None, compare=False)
+
+    def __post_init__(self):
+        assert self.action in ACTIONS, f"Unknown action {self.action}"
+
+
+class Journal:
+    """
+    Append-only JSONL file: the plan (one line per operation) followed by the
+    status of each operation as soon as it is applied
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.fp = None
+
+    def save(self, operations: List[Operation]):
+        """
+        write a new plan, replacing any previous journal
+        """
+        with self.path.open("w", encoding="utf8") as fp:
+            for index, operation in enumerate(operations):
+                fp.write(
+                    json.dumps(
+                        {
+                            "id": index,
+                            "action": operation.action,
+                            "source": str(operation.source.absolute()),
+                            "dest": str(operation.dest.absolute()),
+                        }
+                    )
+                    + "\n"
+                )
+
+    def load(self) -> Tuple[List[Operation], Dict[int, str]]:
+        """
+        read the plan and the last known status of each operation
+        """
+        operations, status = [], {}
+        with self.path.open(encoding="utf8") as fp:
+            for line in filter(None, map(str.strip, fp)):
+                entry = json.loads(line)
+                if "action" in entry:
+                    assert entry["id"] == len(operations), "Corrupted journal"
+                    operations.append(
+                        Operation(
+                            entry["action"], Path(entry["source"]), Path(entry["dest"])
+                        )
+                    )
+                else:
+                    status[entry["id"]] = entry["status"]
+        return operations, status
+
+    def update(self, index: int, status: str):
+        """
+        append the status of an operation, flushed so that it survives a crash
+        """
+        if self.fp is None:
+            self.fp = self.path.open("a", encoding="utf8")
+        self.fp.write(json.dumps({"id": index, "status": status}) + "\n")
+        self.fp.flush()
+
+    def close(self):
+        if self.fp is not None:
+            os.fsync(self.fp.fileno())
+            self.fp.close()
+            self.fp = None
+
+
+@lru_cache(maxsize=None)
+def _device(folder: Path) -> int:
+    return folder.stat().st_dev
+
+
+def _run(operation: Operation, check_exists: bool) -> bool:
+    """
+    apply a single operation, return False if it was already applied
+    """
+    if check_exists:
+        if (
+            operation.action == "move"
+            and operation.dest.exists()
+            and not operation.source.exists()
+        ):
+            return False
+        if operation.dest.exists():
+            raise FileExistsError(f"{operation.dest} already exists")
+    same_device = operation.same_device
+    if same_device is None:
+        same_device = _device(operation.source.parent) == _device(operation.dest.parent)
+    ACTIONS[operation.action](operation.source, operation.dest, same_device)
+    return True
+
+
+def apply(
+    operations: List[Operation],
+    journal: Optional[Journal] = None,
+    done: Iterable[int] = (),
+    jobs: Optional[int] = 1,
+    check_exists: bool = False,
+) -> Iterator[Tuple[Operation, Optional[BaseException]]]:
+    """
+    apply the operations not already done, sorted by folder for locality, and
+    yield each operation with its error if any
+    """
+    done = set(done)
+    pending = sorted(
+        (i for i in range(len(operations)) if i not in done),
+        key=lambda i: (operations[i].dest.parent, operations[i].source.parent),
+    )
+    # create all destination folders at once
+    for folder in sorted({operations[i].dest.parent for i in pending}):
+        folder.mkdir(parents=True, exist_ok=True)
+
+    def on_result(index: int, error: Optional[BaseException]):
+        if journal is not None:
+            journal.update(index, DONE if error is None else ERROR)
+        return operations[index], error
+
+    try:
+        if jobs == 1:
+            for index in pending:
+                error = None
+                try:
+                    _run(operations[index], check_exists)
+                except KeyboardInterrupt:
+                    raise
+                except BaseException as exc:  # pylint: disable=broad-except
+                    error = exc
+                yield on_result(index, error)
+        else:
+            # pylint: disable=import-outside-toplevel
+            from concurrent.futures import ThreadPoolExecutor, as_completed
+
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                futures = {
+                    executor.submit(_run, operations[i], check_exists): i
+                    for i in pending
+                }
+                try:
+                    for future in as_completed(futures):
+                        yield on_result(futures[future], future.exception())
+                except KeyboardInterrupt:
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    raise
+    finally:
+        if journal is not None:
+            journal.close()
+
+
+def rollback(
+    journal: Journal,
+) -> Iterator[Tuple[Operation, Optional[BaseException]]]:
+    """
+    revert the operations done, in reverse order
+    """
+    operations, status = journal.load()
+    try:
+        for index in reversed([i for i, s in status.items() if s == DONE]):
+            operation, error = operations[index], None
+            try:
+                if operation.action == "move":
+                    assert (
+                        not operation.source.exists()
+                    ), f"{operation.source} already exists"
+                    move(
+                        operation.dest,
+                        operation.source,
+                        _device(operation.source.parent)
+                        == _device(operation.dest.parent),
+                    )
+                else:
+                    operation.dest.unlink()
+                journal.update(index, UNDONE)
+            except KeyboardInterrupt:
+                raise
+            except BaseException as exc:  # pylint: disable=broad-except
+                error = exc
+            yield operation, error
+    finally:
+        journal.close()
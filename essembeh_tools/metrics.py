@@ -0,0 +1,197 @@
+"""
+Lightweight metrics: counters and histograms, printed or exported at exit
+"""
+import atexit
+import json
+import sys
+from argparse import ArgumentParser, Namespace
+from bisect import bisect_left
+from contextlib import ContextDecorator
+from pathlib import Path
+from threading import Lock
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+# histogram buckets in seconds, from 10µs to 10s
+DEFAULT_BUCKETS = (1e-5, 1e-4, 1e-3, 1e-2, 0.1, 1, 10)
+
+
+class Counter:
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.value = 0
+        self.lock = Lock()
+
+    def inc(self, amount: float = 1):
+        with self.lock:
+            self.value += amount
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.lock = Lock()
+
+    def observe(self, value: float):
+        with self.lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            self.max = max(self.max, value)
+
+    def time(self) -> "Timer":
+        """
+        context manager (or decorator) observing the elapsed time
+        """
+        return Timer(self)
+
+
+class Timer(ContextDecorator):
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self.start = 0.0
+
+    def _recreate_cm(self):
+        # use a new timer for each call when used as a decorator
+        return Timer(self.histogram)
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.histogram.observe(perf_counter() - self.start)
+        return False
+
+
+class Registry:
+    """
+    All metrics of the process
+    """
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.metrics: Dict[str, object] = {}
+
+    def counter(self, name: str, description: str) -> Counter:
+        return self.metrics.setdefault(name, Counter(name, description))
+
+    def histogram(self, name: str, description: str) -> Histogram:
+        return self.metrics.setdefault(name, Histogram(name, description))
+
+    def elapsed(self) -> float:
+        return perf_counter() - self.started
+
+    def to_json(self) -> dict:
+        out = {"elapsed_seconds": self.elapsed()}
+        for name, metric in sorted(self.metrics.items()):
+            if isinstance(metric, Counter):
+                out[name] = metric.value
+            elif isinstance(metric, Histogram):
+                out[name] = {
+                    "count": metric.count,
+                    "sum": metric.sum,
+                    "max": metric.max,
+                    "buckets": dict(zip(map(str, metric.buckets), metric.counts)),
+                }
+        return out
+
+    def to_prometheus(self) -> str:
+        out = []
+        for name, metric in sorted(self.metrics.items()):
+            out.append(f"# HELP {name} {metric.description}")
+            if isinstance(metric, Counter):
+                out.append(f"# TYPE {name} counter")
+                out.append(f"{name} {metric.value}")
+            elif isinstance(metric, Histogram):
+                out.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                for bucket, count in zip(metric.buckets, metric.counts):
+                    cumulative += count
+                    out.append(f'{name}_bucket{{le="{bucket}"}} {cumulative}')
+                out.append(f'{name}_bucket{{le="+Inf"}} {metric.count}')
+                out.append(f"{name}_sum {metric.sum}")
+                out.append(f"{name}_count {metric.count}")
+        return "\n".join(out) + "\n"
+
+    def summary(self) -> List[str]:
+        elapsed = self.elapsed()
+        out = [f"elapsed: {elapsed:.3f}s"]
+        for name, metric in sorted(self.metrics.items()):
+            if isinstance(metric, Counter) and metric.value > 0:
+                out.append(f"{name}: {metric.value} ({metric.value / elapsed:.1f}/s)")
+            elif isinstance(metric, Histogram) and metric.count > 0:
+                out.append(
+                    f"{name}: {metric.count} calls, "
+                    + f"avg {metric.sum / metric.count * 1000:.3f}ms, "
+                    + f"max {metric.max * 1000:.3f}ms, "
+                    + f"total {metric.sum:.3f}s"
+                )
+        return out
+
+
+METRICS = Registry()
+
+
+def add_metrics_arguments(parser: ArgumentParser):
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="print timing statistics at exit",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=Path,
+        metavar="FILE",
+        help="export metrics at exit, as JSON if FILE ends with .json, else as Prometheus text",
+    )
+
+
+# exports registered by setup_metrics and not done yet
+_EXPORTS: List[Callable[[], None]] = []
+
+
+def export_metrics():
+    """
+    print or export the metrics as requested on the command line, done at exit
+    or by the caller of a tool, like the server whose forked processes exit
+    without running atexit handlers
+    """
+    while len(_EXPORTS) > 0:
+        _EXPORTS.pop(0)()
+
+
+def setup_metrics(args: Namespace, registry: Optional[Registry] = None):
+    """
+    register the export of metrics at exit given the command line arguments
+    """
+    registry = registry or METRICS
+    # the registry may have been created long before, in the server process
+    registry.started = perf_counter()
+
+    def export():
+        if args.stats:
+            for line in registry.summary():
+                print("   ", line, file=sys.stderr)
+        if args.metrics is not None:
+            args.metrics.write_text(
+                json.dumps(registry.to_json(), indent=2)
+                if args.metrics.suffix == ".json"
+                else registry.to_prometheus()
+            )
+
+    if len(_EXPORTS) == 0:
+        atexit.register(export_metrics)
+    _EXPORTS.append(export)
@@ -0,0 +1,179 @@
+"""
+Mounted filesystems, as listed in /proc/self/mountinfo, and the registry of
+mountpoints shared by ezfuse processes
+"""
+import fcntl
+import json
+import os
+import re
+import select
+import shlex
+from dataclasses import dataclass
+from os import environ
+from pathlib import Path
+from time import monotonic
+from typing import Dict, List, Optional
+
+MOUNTINFO = Path("/proc/self/mountinfo")
+
+
+@dataclass(frozen=True)
+class Mount:
+    mountpoint: Path
+    fstype: str
+    source: str
+
+
+def _unescape(text: str) -> str:
+    # spaces, tabs, newlines and backslashes are escaped in octal
+    return re.sub(r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)), text)
+
+
+def get_mounts(mountinfo: Path = MOUNTINFO) -> Dict[Path, Mount]:
+    return parse_mounts(mountinfo.read_text(encoding="utf8"))
+
+
+def parse_mounts(text: str) -> Dict[Path, Mount]:
+    """
+    parse mountinfo, the last mount wins when several share a mountpoint
+    """
+    out = {}
+    for line in text.splitlines():
+        fields = line.split(" ")
+        # optional fields end with a single dash
+        separator = fields.index("-", 6)
+        mountpoint = Path(_unescape(fields[4]))
+        out[mountpoint] = Mount(
+            mountpoint, fields[separator + 1], _unescape(fields[separator + 2])
+        )
+    return out
+
+
+def wait_mount(
+    mountpoint: Path, timeout: float = 10, mountinfo: Path = MOUNTINFO
+) -> Mount:
+    """
+    wait for a fuse filesystem to be mounted on the mountpoint, the kernel
+    signals changes of the mount table with POLLPRI on mountinfo
+    """
+    deadline = monotonic() + timeout
+    with mountinfo.open("rb") as fp:
+        poller = select.poll()
+        poller.register(fp, select.POLLPRI | select.POLLERR)
+        while True:
+            fp.seek(0)
+            mount = parse_mounts(fp.read().decode("utf8")).get(mountpoint)
+            if mount is not None and mount.fstype.startswith("fuse"):
+                return mount
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"{mountpoint} is not mounted after {timeout}s")
+            # also poll periodically, for files which do not signal changes
+            poller.poll(min(remaining, 0.5) * 1000)
+
+
+def default_registry() -> Path:
+    folder = environ.get("XDG_RUNTIME_DIR")
+    if folder is not None:
+        return Path(folder) / "ezfuse" / "mounts.json"
+    return Path(f"/tmp/ezfuse-{os.getuid()}") / "mounts.json"
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # exists, but belongs to another user
+        pass
+    return True
+
+
+class MountRegistry:
+    """
+    Mountpoints of fuse filesystems keyed by their mount command, with the
+    pids of processes using them, so that crashed ones do not keep a mount
+    forever. The registry is a JSON file, locked with flock and loaded when
+    entering the context, saved when leaving it.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        mountinfo: Path = MOUNTINFO,
+        pid: Optional[int] = None,
+    ):
+        self.path = path or default_registry()
+        self.mountinfo = mountinfo
+        self.pid = pid or os.getpid()
+        self.lock_fd: Optional[int] = None
+        self.entries: Dict[str, Dict] = {}
+
+    def __enter__(self):
+        self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self.lock_fd = os.open(
+            self.path.with_suffix(".lock"), os.O_RDWR | os.O_CREAT, 0o600
+        )
+        fcntl.flock(self.lock_fd, fcntl.LOCK_EX)
+        self.entries = (
+            json.loads(self.path.read_text(encoding="utf8"))
+            if self.path.exists()
+            else {}
+        )
+        return self
+
+    def __exit__(self, *args):
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.entries, indent=2), encoding="utf8")
+        tmp.replace(self.path)
+        os.close(self.lock_fd)
+        self.lock_fd = None
+
+    @staticmethod
+    def key(command: List[str]) -> str:
+        return shlex.join(command)
+
+    def holders(self, entry: Dict) -> List[int]:
+        """
+        the other processes still using the mountpoint, dead ones are pruned
+        """
+        entry["pids"] = [
+            pid for pid in entry.get("pids", []) if pid != self.pid and _alive(pid)
+        ]
+        return entry["pids"]
+
+    def acquire(self, command: List[str]) -> Optional[Path]:
+        """
+        find a fuse filesystem still mounted with the same command and register
+        the current process as one of its holders
+        """
+        key = self.key(command)
+        entry = self.entries.get(key)
+        if entry is not None:
+            mount = get_mounts(self.mountinfo).get(Path(entry["mountpoint"]))
+            if mount is not None and mount.fstype.startswith("fuse"):
+                self.holders(entry).append(self.pid)
+                return mount.mountpoint
+            # unmounted by someone else
+            del self.entries[key]
+        return None
+
+    def add(self, command: List[str], mountpoint: Path):
+        self.entries[self.key(command)] = {
+            "mountpoint": str(mountpoint),
+            "pids": [self.pid],
+        }
+
+    def release(self, command: List[str]) -> int:
+        """
+        unregister the current process and return the count of other processes
+        still using the mountpoint
+        """
+        entry = self.entries.get(self.key(command))
+        if entry is None:
+            return 0
+        return len(self.holders(entry))
+
+    def remove(self, command: List[str]):
+        self.entries.pop(self.key(command), None)
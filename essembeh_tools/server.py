@@ -0,0 +1,261 @@
+"""
+Local server running tools in forked processes of a warm interpreter, and the
+client forwarding a command line to it. The state shared by the tools, like
+exiftool processes or caches, lives in a service process forked when the
+server starts, see service.py.
+
+Protocol: the client sends a single JSON line with argv, cwd and environment,
+then the server sends frames made of a channel byte, a 4 bytes length and the
+payload: channel 1 is stdout, 2 is stderr and 0 is the exit code.
+"""
+import json
+import os
+import signal
+import socket
+import stat
+import struct
+import sys
+from os import environ
+from pathlib import Path
+from collections import OrderedDict
+from socketserver import (
+    ForkingMixIn,
+    StreamRequestHandler,
+    ThreadingMixIn,
+    UnixStreamServer,
+)
+from threading import Lock, Thread
+from typing import Any, Callable, Dict, List, Optional
+
+from .service import SERVICE_ENV
+
+HEADER = struct.Struct("!BI")
+# pid, uid and gid of a unix socket peer
+PEERCRED = struct.Struct("3i")
+EXIT, STDOUT, STDERR = 0, 1, 2
+
+
+def default_socket() -> Path:
+    folder = environ.get("XDG_RUNTIME_DIR")
+    if folder is not None:
+        return Path(folder) / "essembeh-tools" / "server.sock"
+    return Path(f"/tmp/essembeh-tools-{os.getuid()}") / "server.sock"
+
+
+def private_folder(folder: Path) -> Path:
+    """
+    create the folder if needed and ensure only the current user can access it,
+    so that nobody else can connect to the socket or replace it
+    """
+    folder.mkdir(mode=0o700, parents=True, exist_ok=True)
+    st = folder.lstat()
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid():
+        raise PermissionError(f"{folder} is not a folder owned by the current user")
+    if st.st_mode & 0o077 != 0:
+        raise PermissionError(f"{folder} can be accessed by other users")
+    return folder
+
+
+def peer_uid(sock: socket.socket) -> int:
+    """
+    the uid of the process at the other end of a unix socket
+    """
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, PEERCRED.size)
+    return PEERCRED.unpack(creds)[1]
+
+
+def _recv(sock: socket.socket, size: int) -> bytes:
+    out = b""
+    while len(out) < size:
+        chunk = sock.recv(size - len(out))
+        if len(chunk) == 0:
+            raise ConnectionError("Connection closed by server")
+        out += chunk
+    return out
+
+
+class _Handler(StreamRequestHandler):
+    """
+    run the requested tool with its standard output and error forwarded
+    """
+
+    def send(self, channel: int, payload: bytes):
+        self.wfile.write(HEADER.pack(channel, len(payload)) + payload)
+        self.wfile.flush()
+
+    def pump(self, fd: int, channel: int):
+        while len(chunk := os.read(fd, 65536)) > 0:
+            self.send(channel, chunk)
+        os.close(fd)
+
+    def handle(self):
+        request = json.loads(self.rfile.readline())
+        os.chdir(request["cwd"])
+        environ.clear()
+        environ.update(request["env"])
+        if self.server.service_path is not None:
+            environ[SERVICE_ENV] = str(self.server.service_path)
+
+        # redirect file descriptors, so subprocesses output is forwarded too
+        devnull = os.open(os.devnull, os.O_RDWR)
+        os.dup2(devnull, 0)
+        pumps = []
+        for fd, channel in ((1, STDOUT), (2, STDERR)):
+            read_fd, write_fd = os.pipe()
+            os.dup2(write_fd, fd)
+            os.close(write_fd)
+            pumps.append(Thread(target=self.pump, args=(read_fd, channel)))
+        for pump in pumps:
+            pump.start()
+
+        code = self.server.callback(request["argv"])
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(devnull, 1)
+        os.dup2(devnull, 2)
+        for pump in pumps:
+            pump.join()
+        self.send(EXIT, struct.pack("!i", code))
+
+
+class MemoryCache:
+    """
+    Values keyed by namespace and file key, the least recently used ones are
+    evicted when the cache is full
+    """
+
+    def __init__(self, size: int = 100000):
+        self.size = size
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, namespace: str, key: List[int]) -> Any:
+        with self.lock:
+            value = self.entries.get((namespace, *key))
+            if value is not None:
+                self.entries.move_to_end((namespace, *key))
+            return value
+
+    def put(self, namespace: str, key: List[int], value: Any):
+        with self.lock:
+            self.entries[(namespace, *key)] = value
+            self.entries.move_to_end((namespace, *key))
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def services(self) -> Dict[str, Callable]:
+        return {"cache_get": self.get, "cache_put": self.put}
+
+
+class _ServiceHandler(StreamRequestHandler):
+    """
+    answer the calls of a tool, one JSON line each
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            request = json.loads(line)
+            try:
+                function = self.server.services[request["call"]]
+                response = {"result": function(*request["args"])}
+            except Exception as error:  # pylint: disable=broad-except
+                response = {"error": f"{type(error).__name__}: {error}"}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class Service(ThreadingMixIn, UnixStreamServer):
+    """
+    Unix socket server answering each tool in a thread, served by a child of
+    the process creating it and stopped when this process exits
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path: Path, services: Dict[str, Callable]):
+        self.services = services
+        self.owner = os.getpid()
+        if path.is_socket():
+            path.unlink()
+        old_umask = os.umask(0o177)
+        try:
+            super().__init__(str(path), _ServiceHandler)
+        finally:
+            os.umask(old_umask)
+
+    def service_actions(self):
+        if os.getppid() != self.owner:
+            # the server died without stopping us
+            os._exit(0)  # pylint: disable=protected-access
+
+
+class Server(ForkingMixIn, UnixStreamServer):
+    """
+    Unix socket server forking a process for each command, and a process
+    keeping the services warm if any
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        callback: Callable[[List[str]], int],
+        services: Optional[Dict[str, Callable]] = None,
+    ):
+        self.callback = callback
+        private_folder(path.parent)
+        if path.is_socket():
+            path.unlink()
+        old_umask = os.umask(0o177)
+        try:
+            super().__init__(str(path), _Handler)
+        finally:
+            os.umask(old_umask)
+        self.service_path: Optional[Path] = None
+        self.service_pid: Optional[int] = None
+        if services is not None:
+            self.service_path = path.with_name(f"{path.stem}-service{path.suffix}")
+            service = Service(self.service_path, services)
+            # fork before any thread is started, the server stays single
+            # threaded so that it can safely fork for each command
+            self.service_pid = os.fork()
+            if self.service_pid == 0:
+                try:
+                    self.socket.close()
+                    service.serve_forever()
+                finally:
+                    os._exit(0)  # pylint: disable=protected-access
+            service.server_close()
+
+    def server_close(self):
+        super().server_close()
+        if self.service_pid is not None:
+            try:
+                os.kill(self.service_pid, signal.SIGTERM)
+                os.waitpid(self.service_pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                # already dead, or reaped with the command processes
+                pass
+            self.service_pid = None
+            self.service_path.unlink(missing_ok=True)
+
+
+def forward(path: Path, argv: List[str]) -> int:
+    """
+    run a command on the server and return its exit code
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(path))
+        # never send the environment to a server run by another user
+        if peer_uid(sock) != os.getuid():
+            raise PermissionError(f"{path} is not owned by the current user")
+        request = {"argv": argv, "cwd": os.getcwd(), "env": dict(environ)}
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        while True:
+            channel, size = HEADER.unpack(_recv(sock, HEADER.size))
+            payload = _recv(sock, size)
+            if channel == EXIT:
+                return struct.unpack("!i", payload)[0]
+            stream = sys.stdout if channel == STDOUT else sys.stderr
+            stream.buffer.write(payload)
+            stream.flush()
@@ -0,0 +1,72 @@
+"""
+Client of the services kept warm by the server for the tools it runs: a pool
+of exiftool processes and a cache of values computed from file contents.
+Tools not run by the server compute everything themselves.
+
+Protocol: one JSON line per call, with the name of the service and its
+arguments, answered by a JSON line with its result or its error.
+"""
+import json
+import os
+from os import environ
+from pathlib import Path
+from threading import local
+from typing import Any, Callable, List
+
+# socket of the services, set in the processes forked by the server
+SERVICE_ENV = "ESSEMBEH_TOOLS_SERVICE"
+
+_LOCAL = local()
+
+
+def available() -> bool:
+    return SERVICE_ENV in environ
+
+
+def call(name: str, *args: Any) -> Any:
+    """
+    call a service, with a connection kept for each thread
+    """
+    # pylint: disable=import-outside-toplevel
+    import socket
+
+    fp = getattr(_LOCAL, "fp", None)
+    if fp is None or getattr(_LOCAL, "pid", None) != os.getpid():
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(environ[SERVICE_ENV])
+        fp = _LOCAL.fp = sock.makefile("rwb")
+        _LOCAL.pid = os.getpid()
+    fp.write(json.dumps({"call": name, "args": args}).encode() + b"\n")
+    fp.flush()
+    line = fp.readline()
+    if len(line) == 0:
+        _LOCAL.fp = None
+        raise ConnectionError("Connection closed by server")
+    response = json.loads(line)
+    if "error" in response:
+        raise RuntimeError(f"Service {name} failed: {response['error']}")
+    return response["result"]
+
+
+def file_key(file: Path) -> List[int]:
+    """
+    identify a file content: a file renamed in place keeps its key and a
+    modified file gets a new one
+    """
+    st = file.stat()
+    return [st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+def cached(namespace: str, file: Path, compute: Callable[[], Any]) -> Any:
+    """
+    value computed from the content of a file, cached by the server when the
+    tool is run by one
+    """
+    if not available():
+        return compute()
+    key = file_key(file)
+    value = call("cache_get", namespace, key)
+    if value is None:
+        value = compute()
+        call("cache_put", namespace, key, value)
+    return value
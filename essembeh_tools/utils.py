@@ -1,7 +1,7 @@
 from argparse import _ActionsContainer
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Generator, List, Optional, Tuple, Union
+from typing import Dict, Generator, Iterable, List, Optional, Tuple, Union
 
 from .external import ExternalTool
 
@@ -32,6 +32,18 @@ def get_mime(file: Path) -> str:
     return FILE.command("--mime-type", file).check_output(encoding="utf8").strip()
 
 
+def get_mimes(files: Iterable[Path]) -> Dict[Path, str]:
+    """
+    get the mime type of many files with as few processes as possible
+    """
+    out = {}
+    for cmd, batch in FILE.batches(files, "--mime-type", "--"):
+        mimes = cmd.check_output(encoding="utf8").splitlines()
+        assert len(mimes) == len(batch), "Unexpected output from file"
+        out.update(zip(batch, map(str.strip, mimes)))
+    return out
+
+
 def plural(
     sing: str,
     count: int = 0,
@@ -0,0 +1,100 @@
+import asyncio
+import subprocess
+import sys
+from argparse import ArgumentTypeError
+from threading import Event
+from time import monotonic
+
+import pytest
+
+from essembeh_tools.cli.batxaran import (
+    DoneFile,
+    TokenBucket,
+    execute_parallel,
+    parse_burst,
+    parse_rate,
+)
+
+
+def test_done_file(tmp_path):
+    path = tmp_path / "done.txt"
+    path.write_text("a\n# comment\nb\n\na\n# comment\nc")
+    done = DoneFile(path)
+    assert done.load() == 3
+    assert path.read_text() == "a\n# comment\nb\n\n# comment\nc\n"
+    assert "a" in done and "d" not in done
+    done.add("d")
+    done.add("a")
+    done.close()
+    assert path.read_text() == "a\n# comment\nb\n\n# comment\nc\nd\n"
+    assert done.added == 1
+    assert DoneFile(tmp_path / "missing.txt").load() == 0
+    # without duplicates the file is left untouched
+    path.write_text("# comment\na")
+    assert DoneFile(path).load() == 1
+    assert path.read_text() == "# comment\na"
+
+
+def test_parse_rate():
+    assert parse_rate("4") == 4
+    assert parse_rate("2/s") == 2
+    assert parse_rate("30/m") == 0.5
+    assert parse_rate("1.5/h") == 1.5 / 3600
+    for text in ("1/d", "0", "0.0/m"):
+        with pytest.raises(ArgumentTypeError):
+            parse_rate(text)
+    assert parse_burst("3") == 3
+    for text in ("0", "-1", "x"):
+        with pytest.raises(ArgumentTypeError):
+            parse_burst(text)
+
+
+def test_token_bucket():
+    assert TokenBucket().reserve() == 0
+    bucket = TokenBucket(10, burst=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() < 0.01
+    assert 0.09 < bucket.reserve() <= 0.1
+    bucket.feedback(False)
+    assert bucket.rate == 5
+    bucket.feedback(True)
+    assert bucket.rate == 6.25
+
+
+def test_interactive_sleep(tmp_path):
+    items = tmp_path / "items.txt"
+    items.write_text("a\nb\nc\n")
+    # only the first command waits for ENTER, the next ones are executed
+    # after the delay even if the previous command took longer
+    process = subprocess.run(
+        [sys.executable, "-c", "from essembeh_tools.cli.batxaran import run; run()"]
+        + ["--sleep", "0.1", "-x", "sleep 0.2 && echo {}", str(items)],
+        input="\n",
+        capture_output=True,
+        text=True,
+        timeout=30,
+        check=False,
+    )
+    assert process.returncode == 0, process.stdout
+    assert process.stdout.count("OK") == 3
+
+
+def test_parallel_interrupted():
+    done = []
+
+    def items():
+        yield 1, "[1]", "a", "true"
+        # like a fifo without any new line
+        Event().wait()
+
+    async def main():
+        task = asyncio.create_task(
+            execute_parallel(items(), set(), 2, 0, done.append, TokenBucket())
+        )
+        await asyncio.sleep(1)
+        task.cancel()
+
+    start = monotonic()
+    asyncio.run(main())
+    assert monotonic() - start < 5
+    assert done == ["a"]
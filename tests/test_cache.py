@@ -0,0 +1,32 @@
+from pathlib import Path
+
+from essembeh_tools.cache import FileCache
+
+
+def test_cache(tmp_path: Path):
+    file = tmp_path / "file"
+    file.write_text("foo")
+    with FileCache(tmp_path / "cache.sqlite") as cache:
+        assert cache.get_many([file]) == {}
+        cache.put_many({file: {"date": "2020"}})
+        assert cache.get_many([file, tmp_path / "missing"]) == {file: {"date": "2020"}}
+
+    # renamed files are still cached
+    renamed = tmp_path / "renamed"
+    file.rename(renamed)
+    with FileCache(tmp_path / "cache.sqlite") as cache:
+        assert cache.get_many([renamed]) == {renamed: {"date": "2020"}}
+
+    # modified files are not
+    renamed.write_text("bar")
+    with FileCache(tmp_path / "cache.sqlite") as cache:
+        assert cache.get_many([renamed]) == {}
+
+
+def test_evict(tmp_path: Path):
+    file = tmp_path / "file"
+    file.write_text("foo")
+    with FileCache(tmp_path / "cache.sqlite", max_age=-1) as cache:
+        cache.put_many({file: 42})
+        assert cache.evict() == 1
+        assert cache.get_many([file]) == {}
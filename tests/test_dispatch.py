@@ -0,0 +1,52 @@
+import errno
+import os
+from pathlib import Path
+
+import pytest
+
+from essembeh_tools.cli.dispatch import PrefixIndex
+from essembeh_tools.filesystem import copy, move
+
+
+def test_longest_prefix():
+    index = PrefixIndex(map(Path, ["/out/a", "/out/ab", "/out/abc", "/out/b"]))
+    assert index.longest_prefix("abcd.txt") == Path("/out/abc")
+    assert index.longest_prefix("abd.txt") == Path("/out/ab")
+    assert index.longest_prefix("a") == Path("/out/a")
+    assert index.longest_prefix("bar") == Path("/out/b")
+    assert index.longest_prefix("c.txt") is None
+    assert PrefixIndex().longest_prefix("foo") is None
+
+
+@pytest.mark.parametrize("same_device", [True, False])
+def test_move_no_clobber(tmp_path: Path, same_device: bool):
+    source, dest = tmp_path / "source", tmp_path / "dest"
+    source.write_text("source")
+    dest.write_text("dest")
+    with pytest.raises(FileExistsError):
+        move(source, dest, same_device)
+    assert dest.read_text() == "dest"
+    dest.unlink()
+    move(source, dest, same_device)
+    assert dest.read_text() == "source"
+
+
+def test_move_without_hard_links(tmp_path: Path, monkeypatch):
+    def no_link(*args, **kwargs):
+        raise OSError(errno.EPERM, os.strerror(errno.EPERM))
+
+    monkeypatch.setattr(os, "link", no_link)
+    test_move_no_clobber(tmp_path, True)
+
+
+@pytest.mark.parametrize("same_device", [True, False])
+def test_copy(tmp_path: Path, same_device: bool):
+    source, dest = tmp_path / "source", tmp_path / "dest"
+    content = os.urandom(3 * 1024 * 1024 + 1)
+    source.write_bytes(content)
+    source.chmod(0o640)
+    copy(source, dest, same_device)
+    assert dest.read_bytes() == content
+    assert dest.stat().st_mode & 0o777 == 0o640
+    with pytest.raises(FileExistsError):
+        copy(source, dest, same_device)
@@ -0,0 +1,76 @@
+import asyncio
+import sys
+from subprocess import DEVNULL, CalledProcessError
+
+import pytest
+
+from essembeh_tools.external import CoProcess, CoProcessPool, ExternalTool
+
+ECHO = ExternalTool("echo")
+
+# answer each request with its arguments in upper case
+UPPER = """
+import sys
+for line in sys.stdin:
+    line = line.rstrip("\\n")
+    if line == "-execute":
+        print("{ready}", flush=True)
+    else:
+        print(line.upper())
+"""
+
+
+def test_batches():
+    items = [f"item{i}" for i in range(10)]
+    batches = list(ECHO.batches(items, "-n", max_args=4))
+    assert [len(b) for _, b in batches] == [4, 4, 2]
+    assert batches[0][0].command == ["echo", "-n", "item0", "item1", "item2", "item3"]
+    assert sum((b for _, b in batches), []) == items
+
+
+def test_batches_arg_max():
+    items = ["x" * 1000] * 10000
+    batches = list(ECHO.batches(items))
+    assert len(batches) > 1
+    assert sum(len(b) for _, b in batches) == len(items)
+    for cmd, _ in batches:
+        cmd.check_call(stdout=DEVNULL)
+
+
+def test_coprocess():
+    with CoProcess(
+        [sys.executable, "-c", UPPER], execute=["-execute"], ready="{ready}"
+    ) as coprocess:
+        assert coprocess.request("foo", "bar") == "FOO\nBAR\n"
+        pid = coprocess.process.pid
+        assert coprocess.request("baz") == "BAZ\n"
+        assert coprocess.process.pid == pid
+        with pytest.raises(ValueError):
+            coprocess.request("foo\nbar")
+    assert coprocess.process is None
+
+
+def test_pool_lease():
+    pool = CoProcessPool(
+        lambda: CoProcess(
+            [sys.executable, "-c", UPPER], execute=["-execute"], ready="{ready}"
+        )
+    )
+    with pool.lease() as first:
+        assert first.request("foo") == "FOO\n"
+        # a co-process is not leased twice at the same time
+        with pool.lease() as second:
+            assert second is not first
+    with pool.lease() as third:
+        assert third in (first, second)
+    assert len(pool.processes) == 2
+    pool.close()
+    assert first.process is None
+    assert len(pool.idle) == 0
+
+
+def test_async():
+    assert asyncio.run(ECHO.command("foo").check_output_async()) == b"foo\n"
+    with pytest.raises(CalledProcessError):
+        asyncio.run(ExternalTool("false").command().check_output_async())
+    assert asyncio.run(ExternalTool("false").command().run_async()).returncode == 1
@@ -1,7 +1,20 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import ffmpeg
+import pytest
+from PIL import Image
+
+import essembeh_tools.ffmpeg
+from essembeh_tools.cli import video_thumbnails
 from essembeh_tools.ffmpeg import (
+    create_mosaic,
+    extract_frames,
     get_video_duration,
     get_video_fps,
     get_video_resolution,
+    run_with_progress,
 )
 from essembeh_tools.utils import get_mime
 
@@ -22,3 +35,90 @@ def test_ffprobe2(sample2_video):
     ) is not None and 120 < duration < 180
     assert get_video_resolution(sample2_video) == (1920, 1080)
     assert get_mime(sample2_video) == "video/mp4"
+
+
+class FakeStream:
+    """
+    a stream running a python script instead of ffmpeg
+    """
+
+    def __init__(self, script: str):
+        self.script = script
+
+    def global_args(self, *args):
+        return self
+
+    def compile(self):
+        return [sys.executable, "-c", self.script]
+
+
+def test_run_with_progress():
+    script = "print('frame=1\\nspeed=N/A\\nprogress=continue\\nframe=3\\nspeed=2x\\nprogress=end')"
+    assert run_with_progress(FakeStream(script), total=3, progress=True) == 3
+    with pytest.raises(ffmpeg.Error):
+        run_with_progress(FakeStream("import sys; sys.exit('boom')"))
+
+
+def test_extract_frames(tmp_path: Path, monkeypatch):
+    totals = []
+
+    def fake_run(stream, total=None, **kwargs):
+        totals.append(total)
+        return 3
+
+    monkeypatch.setattr(essembeh_tools.ffmpeg, "run_with_progress", fake_run)
+    # like mkv files, without duration
+    monkeypatch.setattr(essembeh_tools.ffmpeg, "get_video_duration", lambda _: None)
+    monkeypatch.setattr(essembeh_tools.ffmpeg, "get_video_fps", lambda _: 25.0)
+    frames = extract_frames(Path("video.mkv"), tmp_path, progress=True)
+    assert frames == [tmp_path / f"{i:08}.jpg" for i in (1, 2, 3)]
+    assert totals == [None]
+
+
+def test_duration_from_format(monkeypatch):
+    probe = {"streams": [{"codec_type": "video"}], "format": {"duration": "12.5"}}
+    monkeypatch.setattr(ffmpeg, "probe", lambda _: probe)
+    assert get_video_duration(Path("video.mkv")) == 12.5
+
+
+def make_video(video: Path, duration: int = 4) -> Path:
+    """
+    generate a test pattern video, mkv files have no stream duration
+    """
+    video.parent.mkdir(parents=True, exist_ok=True)
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-f", "lavfi"]
+        + ["-i", f"testsrc=duration={duration}:size=320x240:rate=10", str(video)],
+        check=True,
+    )
+    return video
+
+
+def test_create_mosaic(tmp_path: Path):
+    video = make_video(tmp_path / "video.mkv")
+    output = create_mosaic(video, tmp_path / "mosaic.jpg", grid=(3, 2), width=80)
+    with Image.open(output) as image:
+        assert image.size == (3 * 80, 2 * 60)
+
+
+def test_video_thumbnails(tmp_path: Path, monkeypatch, capsys):
+    make_video(tmp_path / "a" / "x.mp4")
+    make_video(tmp_path / "b" / "x.mkv")
+    output = tmp_path / "out"
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "video-thumbnails",
+            "-r",
+            "-o",
+            str(output),
+            str(tmp_path / "a"),
+            str(tmp_path / "b"),
+        ],
+    )
+    video_thumbnails.run()
+    assert [f.name for f in output.iterdir()] == ["x.mosaic.jpg"]
+    out = capsys.readouterr().out
+    assert "1 mosaic created" in out
+    assert "is used by another video" in out
@@ -0,0 +1,94 @@
+import hashlib
+import sys
+from pathlib import Path
+
+import pytest
+
+from essembeh_tools.cli.hrenamer import (
+    ALGORITHMS,
+    compute_hash,
+    compute_hashes,
+    render_template,
+    run,
+    shard_folder,
+    template_algorithms,
+    unshard_folder,
+    write_manifest,
+)
+
+
+def test_compute_hashes(tmp_path: Path):
+    file = tmp_path / "file"
+    content = bytes(range(256)) * 10000
+    file.write_bytes(content)
+    digests = compute_hashes(
+        {name: ALGORITHMS[name] for name in ("md5", "sha256")}, file
+    )
+    assert digests == {
+        "md5": hashlib.md5(content).hexdigest(),
+        "sha256": hashlib.sha256(content).hexdigest(),
+    }
+    assert compute_hash(hashlib.sha1, file) == hashlib.sha1(content).hexdigest()
+
+
+def test_template():
+    digests = {"md5": "0123456789abcdef", "sha256": "fedcba9876543210"}
+    assert template_algorithms("{md5:4}-{sha256}-{md5}") == ["md5", "sha256"]
+    assert render_template("{md5}", digests) == "0123456789abcdef"
+    assert render_template("{md5:4}-{sha256:6}", digests) == "0123-fedcba"
+
+
+def test_manifest(tmp_path: Path):
+    manifest = tmp_path / "manifest"
+    write_manifest(manifest, {Path("a"): {"md5": "00", "sha256": "11"}})
+    assert manifest.read_text().splitlines() == ["MD5 (a) = 00", "SHA256 (a) = 11"]
+    write_manifest(manifest, {Path("a"): {"blake2b": "22"}})
+    assert manifest.read_text().splitlines() == ["BLAKE2b-128 (a) = 22"]
+
+
+def test_blake2b(tmp_path: Path):
+    file = tmp_path / "file"
+    file.write_bytes(b"foo")
+    assert compute_hashes({"blake2b": ALGORITHMS["blake2b"]}, file) == {
+        "blake2b": hashlib.blake2b(b"foo", digest_size=16).hexdigest()
+    }
+
+
+def test_shard_folder():
+    assert shard_folder(Path("out"), "abcdef", (2, 2)) == Path("out/ab/cd")
+    assert shard_folder(Path("out"), "abcdef", (1, 3)) == Path("out/abc")
+
+
+@pytest.mark.parametrize("direct", [False, True])
+def test_compute_hashes_uncached(tmp_path: Path, direct: bool):
+    file = tmp_path / "file"
+    content = bytes(range(256)) * 5000 + b"tail"
+    file.write_bytes(content)
+    assert compute_hashes(
+        {"md5": ALGORITHMS["md5"]},
+        file,
+        direct=direct,
+        drop_cache=True,
+        next_file=file,
+    ) == {"md5": hashlib.md5(content).hexdigest()}
+
+
+def test_unshard_folder():
+    assert unshard_folder(Path("out/ab/cd"), "abcdef", (2, 2)) == Path("out")
+    assert unshard_folder(Path("out/ab"), "abcdef", (2, 2)) == Path("out/ab")
+    assert unshard_folder(Path("ab/cd"), "abcdef", (2, 2)) == Path(".")
+    assert unshard_folder(Path("cd"), "abcdef", (2, 2)) == Path("cd")
+
+
+def test_shard_twice(tmp_path: Path, monkeypatch):
+    file = tmp_path / "file"
+    file.write_bytes(b"content")
+    md5 = hashlib.md5(b"content").hexdigest()
+    monkeypatch.setattr(sys, "argv", ["hrenamer", "--shard", "1:2", str(file)])
+    run()
+    sharded = tmp_path / md5[:2] / md5
+    assert sharded.is_file()
+    # renaming again in place keeps the file in its shard
+    monkeypatch.setattr(sys, "argv", ["hrenamer", "--shard", "1:2", str(sharded)])
+    run()
+    assert sharded.is_file()
@@ -0,0 +1,37 @@
+from essembeh_tools.journal import DONE, UNDONE, Journal, Operation, apply, rollback
+
+
+def test_apply_resume_rollback(tmp_path):
+    sources = [tmp_path / "in" / f"file{i}" for i in range(3)]
+    sources[0].parent.mkdir()
+    for source in sources:
+        source.write_text(source.name)
+    plan = [Operation("move", s, tmp_path / "out" / s.name) for s in sources]
+    journal = Journal(tmp_path / "journal.jsonl")
+    journal.save(plan)
+
+    # simulate a crash after the first operation
+    results = apply(plan, journal=journal)
+    assert next(results) == (plan[0], None)
+    results.close()
+    operations, status = journal.load()
+    assert operations == plan
+    assert status == {0: DONE}
+
+    # resume
+    assert [e for _, e in apply(plan, journal, done=status)] == [None, None]
+    assert all((tmp_path / "out" / s.name).read_text() == s.name for s in sources)
+    assert not any(s.exists() for s in sources)
+
+    # rollback
+    assert [o for o, _ in rollback(journal)] == list(reversed(plan))
+    assert all(s.read_text() == s.name for s in sources)
+    assert set(journal.load()[1].values()) == {UNDONE}
+
+
+def test_apply_check_exists(tmp_path):
+    source, dest = tmp_path / "a", tmp_path / "b"
+    source.touch()
+    dest.touch()
+    ((operation, error),) = apply([Operation("copy", source, dest)], check_exists=True)
+    assert isinstance(error, FileExistsError)
@@ -0,0 +1,50 @@
+import json
+from argparse import Namespace
+from pathlib import Path
+
+from essembeh_tools.metrics import Registry, export_metrics, setup_metrics
+
+
+def test_counter():
+    registry = Registry()
+    counter = registry.counter("files_total", "Files")
+    counter.inc()
+    counter.inc(41)
+    assert registry.counter("files_total", "Files") is counter
+    assert registry.to_json()["files_total"] == 42
+    assert "files_total 42" in registry.to_prometheus()
+
+
+def test_histogram():
+    registry = Registry()
+    histogram = registry.histogram("duration_seconds", "Duration")
+    histogram.observe(0.005)
+    histogram.observe(5)
+
+    @histogram.time()
+    def func():
+        pass
+
+    func()
+    func()
+    assert histogram.count == 4
+    assert histogram.max == 5
+    text = registry.to_prometheus()
+    assert 'duration_seconds_bucket{le="0.01"} 3' in text
+    assert 'duration_seconds_bucket{le="+Inf"} 4' in text
+    assert "duration_seconds_count 4" in text
+    assert registry.summary()[1].startswith("duration_seconds: 4 calls")
+
+
+def test_export_metrics(tmp_path: Path, capsys):
+    registry = Registry()
+    registry.counter("files_total", "Files").inc(3)
+    output = tmp_path / "metrics.json"
+    setup_metrics(Namespace(stats=True, metrics=output), registry)
+    export_metrics()
+    assert json.loads(output.read_text())["files_total"] == 3
+    assert "files_total" in capsys.readouterr().err
+    # exported only once, even if called again at exit
+    output.unlink()
+    export_metrics()
+    assert not output.exists()
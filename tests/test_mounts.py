@@ -0,0 +1,84 @@
+import os
+import subprocess
+from pathlib import Path
+from threading import Timer
+
+import pytest
+
+from essembeh_tools.mounts import MountRegistry, get_mounts, wait_mount
+
+MOUNTINFO = """\
+22 1 8:1 / / rw,relatime shared:1 - ext4 /dev/sda1 rw
+98 22 0:50 / /home/user/ezmount\\040sshfs rw,nosuid,nodev shared:60 - fuse.sshfs user@host:/data rw,user_id=1000
+"""
+
+
+def test_get_mounts(tmp_path: Path):
+    mountinfo = tmp_path / "mountinfo"
+    mountinfo.write_text(MOUNTINFO)
+    mounts = get_mounts(mountinfo)
+    assert mounts[Path("/")].fstype == "ext4"
+    mount = mounts[Path("/home/user/ezmount sshfs")]
+    assert mount.fstype == "fuse.sshfs"
+    assert mount.source == "user@host:/data"
+
+
+def test_registry(tmp_path: Path):
+    mountinfo = tmp_path / "mountinfo"
+    mountinfo.write_text(MOUNTINFO)
+    command = ["sshfs", "user@host:/data"]
+    registry = MountRegistry(tmp_path / "mounts.json", mountinfo=mountinfo)
+    with registry:
+        assert registry.acquire(command) is None
+        registry.add(command, Path("/home/user/ezmount sshfs"))
+
+    # another process reuses the mount
+    other = MountRegistry(
+        tmp_path / "mounts.json", mountinfo=mountinfo, pid=os.getppid()
+    )
+    with other:
+        assert other.acquire(command) == Path("/home/user/ezmount sshfs")
+        assert other.acquire(["sshfs", "user@host:/other"]) is None
+    with registry:
+        assert registry.release(command) == 1
+    with other:
+        assert other.release(command) == 0
+
+    # the mount disappeared
+    mountinfo.write_text(MOUNTINFO.splitlines()[0] + "\n")
+    with registry:
+        assert registry.acquire(command) is None
+        assert registry.entries == {}
+
+
+def test_registry_dead_holder(tmp_path: Path):
+    mountinfo = tmp_path / "mountinfo"
+    mountinfo.write_text(MOUNTINFO)
+    command = ["sshfs", "user@host:/data"]
+    process = subprocess.Popen(["true"])
+    process.wait()
+    crashed = MountRegistry(
+        tmp_path / "mounts.json", mountinfo=mountinfo, pid=process.pid
+    )
+    with crashed:
+        crashed.add(command, Path("/home/user/ezmount sshfs"))
+
+    # the process exited without releasing the mount
+    registry = MountRegistry(tmp_path / "mounts.json", mountinfo=mountinfo)
+    with registry:
+        assert registry.acquire(command) == Path("/home/user/ezmount sshfs")
+        assert registry.entries[registry.key(command)]["pids"] == [os.getpid()]
+        assert registry.release(command) == 0
+
+
+def test_wait_mount(tmp_path: Path):
+    mountinfo = tmp_path / "mountinfo"
+    mountinfo.write_text(MOUNTINFO.splitlines()[0] + "\n")
+    with pytest.raises(TimeoutError):
+        wait_mount(Path("/home/user/ezmount sshfs"), timeout=0.2, mountinfo=mountinfo)
+
+    timer = Timer(0.3, mountinfo.write_text, args=(MOUNTINFO,))
+    timer.start()
+    mount = wait_mount(Path("/home/user/ezmount sshfs"), timeout=5, mountinfo=mountinfo)
+    assert mount.source == "user@host:/data"
+    timer.join()
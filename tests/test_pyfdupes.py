@@ -0,0 +1,23 @@
+from io import StringIO
+from pathlib import Path
+
+from essembeh_tools.cli.pyfdupes import KeepIndex, remove_files
+
+
+def test_keep_index():
+    keep = KeepIndex([Path("photos/keep"), Path("/backup")])
+    assert Path("photos/keep/2020/a.jpg") in keep
+    assert Path("/backup/a.jpg") in keep
+    assert Path("photos/keeper/a.jpg") not in keep
+    assert Path("photos/a.jpg") not in keep
+    assert Path("a.jpg") not in KeepIndex(None)
+
+
+def test_remove_files(tmp_path: Path):
+    files = [tmp_path / f"file{i}" for i in range(1000)]
+    for file in files:
+        file.touch()
+    log = StringIO()
+    assert remove_files(files + [tmp_path / "missing"], jobs=4, log=log) == (1000, 1)
+    assert not any(f.exists() for f in files)
+    assert sorted(log.getvalue().splitlines()) == sorted(map(str, files))
@@ -0,0 +1,89 @@
+import os
+import sys
+from pathlib import Path
+from threading import Thread
+
+import pytest
+
+from essembeh_tools.server import MemoryCache, Server, forward, private_folder
+
+
+def callback(argv):
+    print("out", *argv)
+    print("err", file=sys.stderr)
+    return 3
+
+
+def test_forward(tmp_path, capfd):
+    path = tmp_path / "test.sock"
+    with Server(path, callback) as server:
+        thread = Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            assert forward(path, ["foo", "bar"]) == 3
+        finally:
+            server.shutdown()
+            thread.join()
+    out, err = capfd.readouterr()
+    assert out == "out foo bar\n"
+    assert err == "err\n"
+
+
+def test_private_folder(tmp_path):
+    folder = private_folder(tmp_path / "private")
+    assert folder.stat().st_mode & 0o777 == 0o700
+    folder.chmod(0o755)
+    with pytest.raises(PermissionError):
+        private_folder(folder)
+
+
+def service_callback(argv):
+    # pylint: disable=import-outside-toplevel
+    from essembeh_tools import service
+
+    file = Path(argv[0])
+    calls = []
+    for _ in range(2):
+        print(service.cached("test", file, lambda: calls.append(file) or len(calls)))
+    print(service.call("add", 1, 2))
+    try:
+        service.call("add", 1)
+    except RuntimeError:
+        print("error")
+    return len(calls)
+
+
+def test_service(tmp_path, capfd):
+    path = tmp_path / "test.sock"
+    file = tmp_path / "file.txt"
+    file.write_text("foo")
+    services = {"add": lambda a, b: a + b, **MemoryCache().services()}
+    with Server(path, service_callback, services) as server:
+        thread = Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            # the cache is kept by the service between commands
+            assert forward(path, [str(file)]) == 1
+            assert forward(path, [str(file)]) == 0
+            file.write_text("foobar")
+            assert forward(path, [str(file)]) == 1
+        finally:
+            server.shutdown()
+            thread.join()
+        pid = server.service_pid
+    out, _err = capfd.readouterr()
+    assert out == "1\n1\n3\nerror\n" * 3
+    assert not server.service_path.exists()
+    with pytest.raises(ChildProcessError):
+        os.waitpid(pid, 0)
+
+
+def test_memory_cache():
+    cache = MemoryCache(size=2)
+    cache.put("ns", [1], "a")
+    cache.put("ns", [2], "b")
+    assert cache.get("ns", [1]) == "a"
+    cache.put("ns", [3], "c")
+    assert cache.get("ns", [1]) == "a"
+    assert cache.get("ns", [2]) is None
+    assert cache.get("other", [3]) is None
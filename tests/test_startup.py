@@ -0,0 +1,63 @@
+import subprocess
+import sys
+from typing import Dict
+
+import pytest
+
+# startup budget of each entry point, in milliseconds
+STARTUP_BUDGETS = {
+    "batxaran": 150,
+    "date_renamer": 150,
+    "dispatch": 150,
+    "ezfuse": 150,
+    "hrenamer": 150,
+    "journal": 150,
+    "multicall": 150,
+    "pyfdupes": 150,
+    "virenamer": 150,
+    "images_to_video": 150,
+    "video_to_images": 150,
+    "video_thumbnails": 150,
+}
+
+# modules which are slow to import and must only be imported when needed
+LAZY_MODULES = (
+    "PIL",
+    "asyncio",
+    "blake3",
+    "ffmpeg",
+    "importlib.metadata",
+    "jsonpath_ng",
+    "lazy_object_proxy",
+    "tqdm",
+    "xxhash",
+)
+
+
+def import_times(module: str) -> Dict[str, int]:
+    """
+    return the cumulative import time in microseconds of each imported module
+    """
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stderr
+    out = {}
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                out[name.strip()] = int(cumulative)
+    return out
+
+
+@pytest.mark.parametrize("tool", STARTUP_BUDGETS.keys())
+def test_startup(tool):
+    module = f"essembeh_tools.cli.{tool}"
+    times = import_times(module)
+    assert module in times
+    for lazy_module in LAZY_MODULES:
+        assert lazy_module not in times, f"{lazy_module} imported by {module}"
+    assert times[module] / 1000 < STARTUP_BUDGETS[tool]
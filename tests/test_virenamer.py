@@ -0,0 +1,102 @@
+from pathlib import Path
+
+import pytest
+
+from essembeh_tools.cli.virenamer import (
+    bulk_rename,
+    parse_ids,
+    parse_script,
+    plan_renames,
+    snapshot,
+)
+
+
+def test_plan_renames_chain_and_cycle(tmp_path):
+    a, b, c, d = (tmp_path / x for x in "abcd")
+    steps = plan_renames({a: b, b: c, d: d.with_name("e")})
+    assert [(x, y) for x, y, _ in steps] == [
+        (b, c),
+        (a, b),
+        (d, d.with_name("e")),
+    ]
+    steps = plan_renames({a: b, b: c, c: a})
+    assert len(steps) == 4
+    assert steps[0][0] == a and steps[-1][1] == b
+
+
+def test_bulk_rename_swap(tmp_path):
+    a, b, c = (tmp_path / x for x in "abc")
+    for file in (a, b, c):
+        file.write_text(file.name)
+    assert snapshot([a, b, tmp_path / "x", tmp_path / "foo" / "y"]) == {a, b}
+    bulk_rename([a, b, c], [b, a, tmp_path / "foo" / "bar" / "c"])
+    assert a.read_text() == "b"
+    assert b.read_text() == "a"
+    assert (tmp_path / "foo" / "bar" / "c").read_text() == "c"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a", "b", "foo"]
+
+
+def test_bulk_rename_conflicts(tmp_path):
+    a, b, c = (tmp_path / x for x in "abc")
+    for file in (a, b, c):
+        file.write_text(file.name)
+    # c exists and is not renamed: nothing should move
+    bulk_rename([a, b], [b, c])
+    assert [p.read_text() for p in (a, b, c)] == ["a", "b", "c"]
+    # c is deleted so b can be renamed
+    bulk_rename([a, b, c], [b, c, None], delete=True)
+    assert not a.exists()
+    assert [p.read_text() for p in (b, c)] == ["a", "b"]
+
+
+def test_parse_ids():
+    files = [Path("a"), Path("b"), Path("c")]
+    assert parse_ids(["3\tz", "", "1\t", "2"], files) == (
+        [Path("c"), Path("a"), Path("b")],
+        [Path("z"), None, None],
+    )
+    with pytest.raises(AssertionError):
+        parse_ids(["4\tz"], files)
+    with pytest.raises(AssertionError):
+        parse_ids(["1\tz", "1\ty"], files)
+    with pytest.raises(AssertionError):
+        parse_ids(["z"], files)
+
+
+def test_parse_script(tmp_path):
+    a = tmp_path / "a"
+    a.touch()
+    assert parse_script([f"{a}\t{tmp_path}/b", f"{tmp_path}/missing\tc"]) == (
+        [a],
+        [tmp_path / "b"],
+    )
+    assert parse_script([str(a)]) == ([a], [None])
+
+
+def test_bulk_rename_jobs_trash(tmp_path):
+    folder, trash = tmp_path / "folder", tmp_path / "trash"
+    folder.mkdir()
+    (folder / "a").mkdir()
+    (folder / "a" / "x").touch()
+    for name in "bcd":
+        (folder / name).write_text(name)
+    bulk_rename(
+        [folder / x for x in "abcd"],
+        [None, folder / "c", folder / "b", folder / "e"],
+        delete=True,
+        jobs=4,
+        trash=trash,
+    )
+    assert sorted(p.name for p in folder.iterdir()) == ["b", "c", "e"]
+    assert [(folder / x).read_text() for x in "bce"] == ["c", "b", "d"]
+    assert list(trash.iterdir()) == []
+
+
+def test_bulk_rename_failure(tmp_path):
+    a, b = tmp_path / "a", tmp_path / "b"
+    a.mkdir()
+    b.touch()
+    # a folder cannot be moved inside itself, the other rename is still done
+    with pytest.raises(OSError, match="Cannot delete or rename 1 file"):
+        bulk_rename([a, b], [a / "sub" / "a", tmp_path / "c"], jobs=2)
+    assert (tmp_path / "c").exists()